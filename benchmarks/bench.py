@@ -0,0 +1,274 @@
+"""Micro-benchmarks for the data-access helpers and the hot routes.
+
+    python benchmarks/bench.py --sizes 1000 100000 --out results.json
+    python benchmarks/bench.py --sizes 1000 --baseline results.json
+
+Each size builds (or reuses, see --cache-dir) a database with that many
+students, then times every operation through the Flask test client.
+"""
+
+import argparse, io, json, os, platform, random, sqlite3, statistics, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flaskr"))
+
+STUDENTS_PER_CLASS = 24
+IMPORT_ROWS = 2000
+PROMOTE_STUDENTS = 100
+PAGES_WALKED = 10
+REGRESSION_THRESHOLD = 0.2  # 20% slower median than the baseline
+
+
+def build_db(path, students, seed=42):
+    # Same generator as populate.py, a quarter of the classes archived
+    from populate import generate
+
+    generate(
+        path,
+        students=students,
+        classes=max(students // STUDENTS_PER_CLASS, 1),
+        archived_ratio=0.25,
+        overlap=0.05,
+        seed=seed,
+        workers=os.cpu_count() if students >= 100000 else 1,
+    )
+
+
+def expect(response, status=200):
+    # A 500, a redirect to the wrong place or the app's "Database error" page
+    # must fail the run, not be timed as a fast request
+    body = response.get_data(as_text=True)
+    if response.status_code != status or body.startswith("Database error"):
+        request = response.request
+        raise RuntimeError(f"{request.method} {request.path} returned {response.status_code}: {body[:200]!r}")
+    return response
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func()
+        samples.append(time.perf_counter() - start)
+    return samples, rows
+
+
+def summarize(samples, rows):
+    median = statistics.median(samples)
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "median_ms": round(median * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "rows": rows,
+        "rows_per_sec": round(rows / median) if rows and median else None,
+    }
+
+
+def clear_caches(app_module):
+    import search
+
+    app_module.page_cache.clear()
+    app_module.class_cache.clear()
+    search.cache.entries.clear()
+
+
+def run_size(app_module, path, students, repeat):
+    app = app_module.app
+    app.config["DATABASE"] = path
+    app.config["BACKGROUND_IMPORT_BYTES"] = float("inf")  # time the import itself
+    client = app.test_client()
+    clear_caches(app_module)
+
+    con = sqlite3.connect(path)
+    class_id = con.execute(
+        "SELECT class_id FROM class WHERE archived = 0 ORDER BY class_id LIMIT 1;"
+    ).fetchone()[0]
+    con.close()
+
+    def uncached(func):
+        def run():
+            clear_caches(app_module)
+            return func()
+
+        return run
+
+    def in_request(func):
+        def run():
+            with app.test_request_context():
+                return func()
+
+        return run
+
+    def walk_pages():
+        # Follow the Next cursor like a user paging through a roster
+        url, pages = f"/list?class_id={class_id}", 0
+        while url and pages < PAGES_WALKED:
+            html = expect(client.get(url)).get_data(as_text=True)
+            pages += 1
+            marker = html.find('class="next-btn page-link"')
+            url = None
+            if marker != -1:
+                start = html.find('href="', marker) + 6
+                url = html[start : html.find('"', start)].replace("&amp;", "&")
+        return pages * 8
+
+    def import_csv():
+        con = sqlite3.connect(path)
+        new_class = con.execute(
+            "INSERT INTO class (course, class_type, time_slot, location, year, archived) VALUES ('Junior Fullstack Developer', 'PowerUp', 'Morning', 'Porto', 2030, 0);"
+        ).lastrowid
+        con.commit()
+        con.close()
+        token = random.randrange(10**9)
+        lines = ["Name,email,phone"] + [
+            f"Import {i},import{token}.{i}@example.pt,+351 91{random.randint(1000000, 9999999)}"
+            for i in range(IMPORT_ROWS)
+        ]
+        data = io.BytesIO("\n".join(lines).encode())
+        # Redirected to the roster; rejected rows would show the report instead
+        expect(
+            client.post(
+                "/actions/import_data",
+                data={"class_id": str(new_class), "import": (data, "bench.csv")},
+                content_type="multipart/form-data",
+            ),
+            302,
+        )
+        import_csv.last_class = new_class
+        return IMPORT_ROWS
+
+    def promote():
+        con = sqlite3.connect(path)
+        source = con.execute(
+            "SELECT class_id FROM class WHERE archived = 0 AND class_type = 'PowerUp' ORDER BY class_id DESC LIMIT 1;"
+        ).fetchone()[0]
+        ids = [
+            str(row[0])
+            for row in con.execute(
+                "SELECT student_id FROM class_student WHERE class_id = ? LIMIT ?;",
+                (source, PROMOTE_STUDENTS),
+            )
+        ]
+        con.close()
+        expect(client.post("/confirm_advance", data={"class_id": str(source), "checked": ids}), 302)
+        return len(ids)
+
+    def delete():
+        import_csv()
+        start = time.perf_counter()
+        expect(client.post("/actions/delete", data={"class_id": str(import_csv.last_class)}))
+        delete.elapsed = time.perf_counter() - start
+        return IMPORT_ROWS
+
+    results = {}
+    operations = {
+        "fetch_classes": (in_request(lambda: len(app_module.fetch_classes(1)["classes_per_page"])), repeat),
+        "fetch_students": (
+            in_request(lambda: len(app_module.fetch_students(class_id, 1)["students_per_page"])),
+            repeat,
+        ),
+        "pagination (10 pages, uncached)": (uncached(walk_pages), max(repeat // 4, 1)),
+        "/list (cached)": (lambda: expect(client.get(f"/list?class_id={class_id}")) and 8, repeat),
+        "/search (uncached)": (
+            uncached(lambda: len(expect(client.get("/search?q=silva&scope=all")).get_json()["results"])),
+            repeat,
+        ),
+        "/search (cached)": (
+            lambda: len(expect(client.get("/search?q=silva&scope=all")).get_json()["results"]),
+            repeat,
+        ),
+        "import_data": (import_csv, max(repeat // 10, 1)),
+        "confirm_advance": (promote, max(repeat // 10, 1)),
+    }
+    for name, (func, runs) in operations.items():
+        samples, rows = timed(func, runs)
+        results[name] = summarize(samples, rows)
+        print(f"  {name:34} {results[name]['median_ms']:>10.3f} ms  {results[name]['rows_per_sec'] or '':>10} rows/s")
+
+    # delete_class is timed around the POST only, not the import that sets it up
+    samples = []
+    for _ in range(max(repeat // 10, 1)):
+        delete()
+        samples.append(delete.elapsed)
+    results["delete_class"] = summarize(samples, IMPORT_ROWS)
+    print(f"  {'delete_class':34} {results['delete_class']['median_ms']:>10.3f} ms")
+
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for size, operations in results["sizes"].items():
+        for name, stats in operations.items():
+            before = baseline.get("sizes", {}).get(size, {}).get(name)
+            if not before:
+                continue
+            change = stats["median_ms"] / before["median_ms"] - 1
+            flag = "REGRESSION" if change > threshold else ""
+            print(f"  {size:>8} {name:34} {before['median_ms']:>10.3f} -> {stats['median_ms']:>10.3f} ms ({change:+.0%}) {flag}")
+            if flag:
+                regressions.append((size, name, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--cache-dir", default=None, help="keep built databases here and reuse them")
+    parser.add_argument("--out", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=None, help="compare against an earlier --out file")
+    args = parser.parse_args()
+
+    workdir = args.cache_dir or tempfile.mkdtemp(prefix="bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ["DATABASE"] = os.path.join(workdir, "bench-app.db")
+    import app as app_module
+    from archive import archive_path
+    from migrations import migrate
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "sizes": {},
+    }
+
+    for size in args.sizes:
+        seed_path = os.path.join(workdir, f"students-{size}.db")
+        if not os.path.exists(seed_path):
+            print(f"Building {size} students...")
+            start = time.perf_counter()
+            build_db(seed_path, size)
+            print(f"  built in {time.perf_counter() - start:.1f}s")
+
+        # Work on a copy - the write benchmarks change the data
+        path = os.path.join(workdir, f"run-{size}.db")
+        src, dst = sqlite3.connect(seed_path), sqlite3.connect(path)
+        src.backup(dst)
+        src.close()
+        migrate(dst)  # A seed cached by an older build catches up on migrations
+        dst.close()
+        # And starts with an empty archive tier
+        if os.path.exists(archive_path(path)):
+            os.remove(archive_path(path))
+
+        print(f"{size} students:")
+        results["sizes"][str(size)] = run_size(app_module, path, size, args.repeat)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print("Compared to baseline:")
+        if compare(results, baseline):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+from flask import Blueprint, current_app, jsonify, request
+from db import get_db
+from pagination import keyset_page
+from versions import class_version, GLOBAL, ACTIVE_CLASSES, ARCHIVED_CLASSES
+from conditional import conditional
+from archive import ARCHIVE_ONLY
+import metrics
+import sqlite3
+
+
+# Versioned JSON API - a breaking change gets /api/v2, this one keeps working
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+API_LIMIT = 50
+MAX_API_LIMIT = 500
+CLASS_FIELDS = [
+    "class_id",
+    "course",
+    "class_type",
+    "time_slot",
+    "location",
+    "year",
+    "archived",
+    "student_count",
+    "promoted_count",
+]
+CLASS_ORDER = ["location", "class_id"]
+STUDENT_FIELDS = ["student_id", "name", "email", "phone", "location", "course", "class_type"]
+ROSTER_ORDER = ["s.name", "s.student_id"]
+# Students enrolled only in classes moved to the archive tier are still students.
+# Their ids are only unique within a tier (freed ids get reused), so a student
+# is (tier, student_id): /students/<id> or /students/archive/<id>
+ALL_STUDENT_FIELDS = [*STUDENT_FIELDS, "tier"]
+ALL_STUDENT_ORDER = ["student_id", "tier"]  # id first: each tier then reads its primary key in order
+ALL_STUDENTS = f"""(SELECT {", ".join(STUDENT_FIELDS)}, 'active' AS tier FROM main.student
+UNION ALL
+SELECT {", ".join(f"a.{field}" for field in STUDENT_FIELDS)}, 'archive' AS tier
+FROM archive.student AS a WHERE {ARCHIVE_ONLY})"""
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@api.errorhandler(BadRequest)
+def bad_request(e):
+    return jsonify({"error": str(e)}), 400
+
+
+@api.errorhandler(sqlite3.Error)
+def database_error(e):
+    current_app.logger.error("Database error on %s: %s", request.path, e)
+    metrics.record_error("database")
+    return jsonify({"error": f"Database error: {e}"}), 500
+
+
+def connect():
+    return get_db(current_app.config["DATABASE"]).cursor()
+
+
+def requested_fields(allowed):
+    # ?fields=name,email - only these columns are selected, in the order given
+    fields = [field.strip() for field in request.args.get("fields", "").split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(allowed)}")
+    return fields or allowed
+
+
+def int_arg(name, default=None, choices=None):
+    value = request.args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    if choices is not None and value not in choices:
+        raise BadRequest(f"{name} must be one of {', '.join(map(str, choices))}")
+    return value
+
+
+def page_of(cur, table, fields, where, params, order_by):
+    # The sort keys are always selected so the cursor can be built, then dropped if not asked for
+    prefix = order_by[0].rpartition(".")[0]
+    columns = list(dict.fromkeys([*fields, *(key.split(".")[-1] for key in order_by)]))
+    select = f"SELECT {', '.join(f'{prefix}.{column}' if prefix else column for column in columns)} FROM {table}"
+    limit = min(max(int_arg("limit", API_LIMIT), 1), MAX_API_LIMIT)
+
+    rows, next_cursor, prev_cursor = keyset_page(
+        cur,
+        select,
+        " AND ".join(where) or "1",
+        params,
+        order_by,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=limit,
+    )
+    return {
+        "data": [{field: row[field] for field in fields} for row in rows],
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    }
+
+
+def found(body):
+    return jsonify(body) if body is not None else (jsonify({"error": "Not found"}), 404)
+
+
+@api.route("/classes")
+def classes():
+    cur = connect()
+    fields = requested_fields(CLASS_FIELDS)
+    archived = int_arg("archived", choices=(0, 1))
+    year = int_arg("year")
+    location = request.args.get("location")
+
+    where, params = [], []
+    for column, value in (("archived", archived), ("location", location), ("year", year)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+
+    versions = {0: [ACTIVE_CLASSES], 1: [ARCHIVED_CLASSES]}.get(archived, [ACTIVE_CLASSES, ARCHIVED_CLASSES])
+    return conditional(
+        cur, versions, lambda: jsonify(page_of(cur, "class", fields, where, params, CLASS_ORDER))
+    )
+
+
+@api.route("/classes/<int:class_id>")
+def class_detail(class_id):
+    cur = connect()
+    fields = requested_fields(CLASS_FIELDS)
+
+    def build():
+        row = cur.execute(
+            f"SELECT {', '.join(fields)} FROM class WHERE class_id = (?);", (class_id,)
+        ).fetchone()
+        return found({"data": dict(row)} if row else None)
+
+    return conditional(cur, [class_version(class_id)], build)
+
+
+@api.route("/classes/<int:class_id>/students")
+def roster(class_id):
+    cur = connect()
+    fields = requested_fields(STUDENT_FIELDS)
+
+    def build():
+        row = cur.execute("SELECT in_archive FROM class WHERE class_id = (?);", (class_id,)).fetchone()
+        if row is None:
+            return found(None)
+        tier = "archive." if row[0] else ""
+        page = page_of(
+            cur,
+            f"{tier}class_student AS cs JOIN {tier}student AS s ON s.student_id = cs.student_id",
+            fields,
+            ["cs.class_id = ?"],
+            [class_id],
+            ROSTER_ORDER,
+        )
+        return jsonify(page)
+
+    return conditional(cur, [class_version(class_id)], build)
+
+
+@api.route("/students")
+def students():
+    cur = connect()
+    fields = requested_fields(ALL_STUDENT_FIELDS)
+    location = request.args.get("location")
+    where, params = (["location = ?"], [location]) if location else ([], [])
+
+    # Students have no counter of their own; any write moves the global one
+    return conditional(
+        cur, [GLOBAL], lambda: jsonify(page_of(cur, ALL_STUDENTS, fields, where, params, ALL_STUDENT_ORDER))
+    )
+
+
+def student_in(table, where, student_id):
+    cur = connect()
+    fields = requested_fields(STUDENT_FIELDS)
+
+    def build():
+        row = cur.execute(
+            f"SELECT {', '.join(fields)} FROM {table} WHERE student_id = (?) AND {where};", (student_id,)
+        ).fetchone()
+        return found({"data": dict(row)} if row else None)
+
+    return conditional(cur, [GLOBAL], build)
+
+
+@api.route("/students/<int:student_id>")
+def student_detail(student_id):
+    return student_in("main.student", "1", student_id)
+
+
+@api.route("/students/archive/<int:student_id>")
+def archived_student_detail(student_id):
+    return student_in("archive.student AS a", ARCHIVE_ONLY, student_id)
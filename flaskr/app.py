@@ -1,115 +1,228 @@
+import startup  # First: cold-start timing counts everything imported after it
 from flask import Flask, render_template, request, session, redirect, url_for, jsonify
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
-from dotenv import load_dotenv
-from io import TextIOWrapper
-from utils import validate_phone_num, LOCATIONS, CLASS_TYPES, COURSES, TIME_SLOTS
-import sqlite3, datetime, os, csv
-
-
-load_dotenv()
+from utils import normalize_email, validate_phone_num, LOCATIONS, CLASS_TYPES, COURSES, TIME_SLOTS
+from pagination import keyset_page, count_pages
+from db import get_db
+from migrations import migrate_db
+from search import search_classes, SEARCH_LIMIT
+from importer import import_students, sync_students
+from jobs import JobRunner, submit_import
+from promotion import promote, parse_selection
+from cache import LRUCache
+from auth import PasswordVerifier, LoginBusy
+from api import api
+from export import export
+from conditional import conditional
+from versions import (
+    bump_version,
+    bump_roster,
+    bump_student_classes,
+    class_version,
+    data_versions,
+    GLOBAL,
+    ACTIVE_CLASSES,
+    ARCHIVED_CLASSES,
+)
+import archive, assets, compress, db, metrics
+import sqlite3, datetime, os, queue, tempfile, time
+
+
+startup.load_env(os.path.dirname(os.path.abspath(__file__)))
 
 app = Flask(__name__)
+startup.configure(app)
 
 app.config["SESSION_PERMANENT"] = os.getenv("SESSION_PERMANENT", "False") == "True"
 app.config["SESSION_TYPE"] = os.getenv("SESSION_TYPE", "filesystem")
 app.secret_key = os.getenv("SECRET_KEY", "default_secret_key")
 
 db_path = "database.db"
-ph = PasswordHasher()
+app.config["DATABASE"] = os.getenv("DATABASE", db_path)
+db.init_app(app)
+metrics.init_app(app)
+assets.init_app(app)
+# Outermost, so it sees every response exactly as it would go out
+app.wsgi_app = compress.CompressionMiddleware(app.wsgi_app, app.static_folder, app.static_url_path)
+app.register_blueprint(api)
+app.register_blueprint(export)
+migrate_db(app.config["DATABASE"])
+app.config["BACKGROUND_IMPORT_BYTES"] = int(
+    os.getenv("BACKGROUND_IMPORT_BYTES", 1024 * 1024)
+)
+jobs = JobRunner()
+
+# Bounded, LRU-evicted caches for class rows and rendered pages
+class_cache = LRUCache(1024)
+page_cache = LRUCache(int(os.getenv("PAGE_CACHE_SIZE", 256)))
+verifier = PasswordVerifier()
+
+metrics.registry.set("flaskr_startup_seconds", {"phase": "import"}, time.perf_counter() - startup.STARTED)
+if startup.WARM_UP:
+    warm_up_seconds = sum(startup.warm_up(app).values())
+    metrics.registry.set("flaskr_startup_seconds", {"phase": "warm_up"}, warm_up_seconds)
+app.logger.info("Started in %.3fs", time.perf_counter() - startup.STARTED)
+
+# Columns and sort keys used for the paginated listings
+CLASS_SELECT = "SELECT class_id, course, class_type, time_slot, location, year, archived, student_count, promoted_count FROM class"
+CLASS_ORDER = ["location", "class_id"]
+# {tier} is "archive." for classes whose roster moved to the archive tier
+STUDENT_SELECT = """SELECT s.student_id, s.name, s.email, s.phone, s.location, s.course, s.class_type
+FROM {tier}class_student AS cs JOIN {tier}student AS s ON s.student_id = cs.student_id"""
+STUDENT_ORDER = ["s.name", "s.student_id"]
 
 
 # Handler functions
 def connect_to_db():
-    # Return dicts instead of tuples
-    con = sqlite3.connect(db_path)
-    con.row_factory = sqlite3.Row
+    # Reuse the request's pooled connection (rows come back as dicts)
+    con = get_db(app.config["DATABASE"])
     cur = con.cursor()
     return con, cur
 
 
-def fetch_classes(page):
+def database_error(e):
+    # Still shown to the user as before, but now logged and counted too
+    app.logger.error("Database error on %s: %s", request.path, e)
+    metrics.record_error("database")
+    return f"Database error: {e}"
+
+
+def fetch_classes(page, after=None, before=None):
     try:
         con, cur = connect_to_db()
 
-        classes = cur.execute(
-            "SELECT * FROM class WHERE archived = 0 ORDER BY location;"
-        ).fetchall()
-        ongoing_classes = [dict(row) for row in classes]
-
-        classes_per_page, total_pages = pagination(ongoing_classes, page)
+        # Trigger-maintained, a few rows per location instead of a scan of class
+        total = cur.execute(
+            "SELECT COALESCE(SUM(classes), 0) FROM class_count WHERE archived = 0;"
+        ).fetchone()[0]
+        classes_per_page, next_cursor, prev_cursor = keyset_page(
+            cur, CLASS_SELECT, "archived = 0", (), CLASS_ORDER, page, after, before
+        )
 
-        return ongoing_classes, classes_per_page, total_pages
+        return {
+            "classes_per_page": classes_per_page,
+            "total_classes": total,
+            **pagination(total, page, next_cursor, prev_cursor),
+        }
 
     except sqlite3.Error as e:
-        return f"Database error: {e}"
-    finally:
-        con.close()
+        return database_error(e)
 
 
-def fetch_archived_classes(page):
+def fetch_archived_classes(page, after=None, before=None):
     try:
         con, cur = connect_to_db()
 
-        archived_classes = cur.execute(
-            "SELECT * FROM class WHERE archived = 1 ORDER BY location;"
-        ).fetchall()
-        archived = [dict(row) for row in archived_classes]
-
-        archived_classes_per_page, total_pages = pagination(archived_classes, page)
+        total = cur.execute(
+            "SELECT COALESCE(SUM(classes), 0) FROM class_count WHERE archived = 1;"
+        ).fetchone()[0]
+        archived_classes_per_page, next_cursor, prev_cursor = keyset_page(
+            cur, CLASS_SELECT, "archived = 1", (), CLASS_ORDER, page, after, before
+        )
 
-        return archived, archived_classes_per_page, total_pages
+        return {
+            "archived_classes_per_page": archived_classes_per_page,
+            "total_archived_classes": total,
+            **pagination(total, page, next_cursor, prev_cursor),
+        }
 
     except sqlite3.Error as e:
-        return f"Database error: {e}"
-    finally:
-        con.close()
+        return database_error(e)
 
 
-def fetch_students(class_id, page):
+def fetch_students(class_id, page, after=None, before=None):
     try:
         con, cur = connect_to_db()
 
-        query = """SELECT * FROM student WHERE 
-        student_id IN (
-        SELECT student_id 
-        FROM class_student 
-         WHERE class_id = (?)
-        ) ORDER BY name ASC;"""
-        cur.execute(query, (class_id,))
-        results = cur.fetchall()
-        students = [dict(row) for row in results]
-
-        # Pagination
-        students_per_page, total_pages = pagination(students, page)
+        row = cur.execute(
+            "SELECT in_archive, student_count FROM class WHERE class_id = (?);", (class_id,)
+        ).fetchone()
+        in_archive, total = row if row else (0, 0)
+        tier = "archive." if in_archive else ""
+        students_per_page, next_cursor, prev_cursor = keyset_page(
+            cur,
+            STUDENT_SELECT.format(tier=tier),
+            "cs.class_id = (?)",
+            (class_id,),
+            STUDENT_ORDER,
+            page,
+            after,
+            before,
+        )
 
-        return students, students_per_page, total_pages
+        return {
+            "students_per_page": students_per_page,
+            "total_students": total,
+            **pagination(total, page, next_cursor, prev_cursor),
+        }
 
     except sqlite3.Error as e:
-        return f"Database error: {e}"
-    finally:
-        con.close()
+        return database_error(e)
+
+
+def fetch_class(class_id):
+    # Class metadata, cached until forget_classes() - a hit costs no query at all
+    key = str(class_id)
+
+    class_data = class_cache.get(key)
+    if class_data is None:
+        con, cur = connect_to_db()
+        row = cur.execute(
+            "SELECT class_id, course, class_type, time_slot, location, year, archived FROM class WHERE class_id = (?)",
+            (class_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        class_data = dict(row)
+        class_cache.set(key, class_data)
+
+    return class_data
+
+
+def forget_classes(*class_ids):
+    # Course, type and location never change; archiving and deleting (the id can be reused) do
+    for class_id in class_ids:
+        class_cache.pop(str(class_id))
 
 
 def fetch_class_type(class_id):
+    class_data = fetch_class(class_id)
+    return class_data["class_type"] if class_data else None
+
+
+def cached_page(key, versions, render):
+    # Rendered HTML keyed on the page and the data versions it was built from,
+    # so a write only misses the pages that show what it changed. A browser that
+    # already has this version gets a 304 without the page cache being consulted.
     con, cur = connect_to_db()
-    row = cur.execute(
-        "SELECT class_type FROM class WHERE class_id = (?)", (class_id)
-    ).fetchone()
+    key = (*key, *page_args())
+
+    def build():
+        cache_key = (*key, data_versions(cur, versions))
+        html = page_cache.get(cache_key)
+        if html is None:
+            html = render()
+            page_cache.set(cache_key, html)
+        return html
 
-    class_type = row["class_type"]
-    return class_type
+    return conditional(cur, versions, build, key=repr(key))
 
 
-def pagination(items, page):
-    # Pagination
-    per_page = 8
-    start = (page - 1) * per_page
-    end = start + per_page
-    total_pages = (len(items) + per_page - 1) // per_page
-    items_per_page = items[start:end]
+def page_args():
+    # Current page number plus the keyset cursor that led to it
+    page = request.args.get("page", 1, type=int)
+    after = request.args.get("after")
+    before = request.args.get("before")
+    return page, after, before
+
 
-    return items_per_page, total_pages
+def pagination(total, page, next_cursor, prev_cursor):
+    # Only the page count is derived from the total, the rows come from keyset_page
+    return {
+        "page": page,
+        "total_pages": count_pages(total),
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor,
+    }
 
 
 # Route functions
@@ -135,34 +248,36 @@ def login():
         con, cur = connect_to_db()
 
         try:
-            query = """SELECT email, password FROM teacher WHERE email = (?);"""
+            query = """SELECT teacher_id, password FROM teacher WHERE email = (?);"""
             cur.execute(query, (email,))
             results = cur.fetchone()
 
+            if not results:
+                error = "Incorrect email or password"
+                return render_template("index/login-form.html", error=error)
+
+            # Argon2 runs on the bounded verifier pool, not on this request thread
             try:
-                if results and ph.verify(results["password"], pw):
-
-                    page = request.args.get("page", 1, type=int)
-                    classes, classes_per_page, total_pages = fetch_classes(page)
-
-                    return render_template(
-                        "homepage/homepage.html",
-                        page=page,
-                        classes_per_page=classes_per_page,
-                        total_pages=total_pages,
-                        classes=classes,
-                        loggedin=True,
-                    )
-            except VerifyMismatchError:
+                matches, new_hash = verifier.verify(results["password"], pw)
+            except LoginBusy:
+                error = "Too many people are logging in, please try again in a moment."
+                return render_template("index/login-form.html", error=error), 503
+
+            if not matches:
                 error = "Incorrect password"
                 return render_template("index/login-form.html", error=error)
-            else:
-                error = "Incorrect email or password"
-                return render_template("index/login-form.html", error=error)
+
+            # The hash was made with older parameters - store one with the current ones
+            if new_hash:
+                cur.execute(
+                    "UPDATE teacher SET password = (?) WHERE teacher_id = (?);",
+                    (new_hash, results["teacher_id"]),
+                )
+                con.commit()
+
+            return redirect(url_for("homepage"))
         except sqlite3.Error as e:
-            return f"Database error: {e}"
-        finally:
-            con.close()
+            return database_error(e)
 
 
 @app.route("/logout")
@@ -181,19 +296,13 @@ def select_ongoing_class():
             return render_template("/archived_classes/archived_classes.html")
 
         class_type = fetch_class_type(class_id)
-        page = request.args.get("page", 1, type=int)
-        students, students_per_page, total_pages = fetch_students(class_id, page)
-
         return render_template(
             "student/student-list.html",
-            students=students,
             class_id=class_id,
             class_type=class_type,
-            students_per_page=students_per_page,
-            total_pages=total_pages,
-            page=page,
             loggedin=True,
             is_active_class=True,
+            **fetch_students(class_id, *page_args()),
         )
 
 
@@ -205,17 +314,11 @@ def select_archived_class():
         if not class_id:
             return render_template("/archived_classes/archived_classes.html")
 
-        page = request.args.get("page", 1, type=int)
-        students, students_per_page, total_pages = fetch_students(class_id, page)
-
         return render_template(
             "archived_classes/archived-student-list.html",
-            students=students,
             class_id=class_id,
-            students_per_page=students_per_page,
-            total_pages=total_pages,
-            page=page,
             loggedin=True,
+            **fetch_students(class_id, *page_args()),
         )
 
 
@@ -264,14 +367,13 @@ def confirm_add_class():
                     new_class["archived"],
                 ),
             )
+            bump_version(cur, ACTIVE_CLASSES)
             con.commit()
 
             return redirect(url_for("homepage"))
 
         except sqlite3.Error as e:
-            return f"Database error: {e}"
-        finally:
-            con.close()
+            return database_error(e)
 
 
 @app.route("/actions/archive", methods=["GET", "POST"])
@@ -283,22 +385,18 @@ def archive_class():
 
         con, cur = connect_to_db()
         cur.execute("UPDATE class SET archived = 1 WHERE class_id = (?)", (class_id,))
+        bump_version(cur, ACTIVE_CLASSES, ARCHIVED_CLASSES, class_version(class_id))
         con.commit()
-        page = request.args.get("page", 1, type=int)
-        classes, classes_per_page, total_pages = fetch_classes(page)
-
+        forget_classes(class_id)
+        # Then the roster leaves the hot tables
+        archive.move_to_archive(app.config["DATABASE"], class_id)
         return render_template(
             "homepage/homepage.html",
-            classes=classes,
             loggedin=True,
-            page=page,
-            classes_per_page=classes_per_page,
-            total_pages=total_pages,
+            **fetch_classes(*page_args()),
         )
     except sqlite3.Error as e:
-        return f"Database error: {e}"
-    finally:
-        con.close()
+        return database_error(e)
 
 
 @app.route("/actions/unarchive", methods=["GET", "POST"])
@@ -307,24 +405,20 @@ def unarchive_class():
         class_id = request.form.get("class_id")
         con, cur = connect_to_db()
 
+        # The roster comes back to the hot tables first (a no-op if it never left)
+        archive.move_from_archive(app.config["DATABASE"], class_id)
         cur.execute("UPDATE class SET archived = 0 WHERE class_id = (?);", (class_id,))
+        bump_version(cur, ACTIVE_CLASSES, ARCHIVED_CLASSES, class_version(class_id))
         con.commit()
-
-        page = request.args.get("page", 1, type=int)
-        archived_classes, archived_classes_per_page, total_pages = (
-            fetch_archived_classes(page)
-        )
+        forget_classes(class_id)
 
         return render_template(
             "archived_classes/archived-classes.html",
-            archived_classes=archived_classes,
             loggedin=True,
-            page=page,
-            archived_classes_per_page=archived_classes_per_page,
-            total_pages=total_pages,
+            **fetch_archived_classes(*page_args()),
         )
-    finally:
-        con.close()
+    except sqlite3.Error as e:
+        return database_error(e)
 
 
 @app.route("/actions/delete", methods=["GET", "POST"])
@@ -334,33 +428,31 @@ def delete_class():
         try:
             con, cur = connect_to_db()
 
-            # Get student_ids associated with the class
+            # Students enrolled only in this class go with it (anti-join on the
+            # other enrollments); the student FK cascade drops their links
             cur.execute(
-                "SELECT student_id FROM class_student WHERE class_id = (?)", (class_id,)
+                """DELETE FROM student WHERE student_id IN (
+                SELECT cs.student_id FROM class_student AS cs
+                WHERE cs.class_id = (?) AND NOT EXISTS (
+                    SELECT 1 FROM class_student AS other
+                    WHERE other.student_id = cs.student_id AND other.class_id != cs.class_id
+                ));""",
+                (class_id,),
             )
-            student_ids = [row[0] for row in cur.fetchall()]
-
-            # Delete students from the student table
-            for student_id in student_ids:
-                cur.execute("DELETE FROM student WHERE student_id = (?)", (student_id,))
-
-            # Delete all students associated with the class being deleted
-            cur.execute("DELETE FROM class_student WHERE class_id = (?);", (class_id,))
+            # Remaining enrollments (e.g. students also in an Advanced class) cascade
             cur.execute("DELETE FROM class WHERE class_id = (?);", (class_id,))
+            bump_version(cur, ACTIVE_CLASSES, ARCHIVED_CLASSES, class_version(class_id))
             con.commit()
+            forget_classes(class_id)
+            archive.delete_archived(app.config["DATABASE"], class_id)
 
-            page = request.args.get("page", 1, type=int)
-            classes, classes_per_page, total_pages = fetch_classes(page)
             return render_template(
                 "homepage/homepage.html",
-                classes=classes,
                 loggedin=True,
-                page=page,
-                classes_per_page=classes_per_page,
-                total_pages=total_pages,
+                **fetch_classes(*page_args()),
             )
-        finally:
-            con.close()
+        except sqlite3.Error as e:
+            return database_error(e)
 
 
 @app.route("/actions/import_data", methods=["GET", "POST"])
@@ -369,49 +461,88 @@ def import_data():
     class_id = request.form.get("class_id")
 
     if class_id:
+        csv_file = request.files.get("import")
+        if not csv_file or not csv_file.filename.endswith(".csv"):
+            return redirect(url_for("list", class_id=class_id))
+
+        # Sync mode makes the roster match the file: adds, updates and removals
+        sync = request.form.get("sync") == "1"
+
+        # Big uploads go to the job queue so they don't hold this worker
+        background = request.form.get("background") or (
+            request.content_length or 0
+        ) > app.config["BACKGROUND_IMPORT_BYTES"]
+        if background:
+            return start_import_job(class_id, csv_file, sync)
+
         try:
             con, cur = connect_to_db()
 
-            # Data from the class itself - Location, course, class_type
-            class_data = cur.execute(
-                "SELECT location, class_type, course FROM class WHERE class_id = (?)",
-                (class_id),
-            ).fetchone()
-
-            csv_file = request.files.get("import")
-            if not csv_file or not csv_file.filename.endswith(".csv"):
-                return redirect(url_for("list", class_id=class_id))
+            # Rows are validated and written in batches as the upload streams in
             with csv_file.stream as f:
-                reader = csv.reader(TextIOWrapper(f, encoding="latin-1"), delimiter=",")
-                next(reader, None)
-
-                for row in reader:
-                    cur.execute(
-                        "INSERT OR IGNORE INTO student (name, email, phone, location, course, class_type) VALUES (?, ?, ?, ?, ?, ?)",
-                        (
-                            row[0],
-                            row[1],
-                            row[2],
-                            class_data["location"],
-                            class_data["course"],
-                            class_data["class_type"],
-                        ),
-                    )
-                    student_id = cur.lastrowid
-                    cur.execute(
-                        "INSERT INTO class_student (student_id, class_id) VALUES (?, ?)",
-                        (student_id, class_id),
-                    )
-
-                con.commit()
+                report = (sync_students if sync else import_students)(con, class_id, f)
 
+            if not report["rejected"] and not sync:
                 return redirect(url_for("list", class_id=class_id))
 
-        finally:
-            con.close()
+            return render_template(
+                "feedback_msg/import-report.html",
+                class_id=class_id,
+                report=report,
+            )
+
+        except LookupError:
+            return redirect(url_for("homepage"))
+        except sqlite3.Error as e:
+            return database_error(e)
     return "Didn't work"
 
 
+def start_import_job(class_id, csv_file, sync=False):
+    # Spool the upload to disk (in chunks) - the request stream dies with the request
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            csv_file.save(f)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    # From here the job owns the file, and removes it even if it can't be queued
+    try:
+        job_id = submit_import(jobs, app.config["DATABASE"], class_id, path, sync=sync)
+    except queue.Full:
+        # Never wait for room: the request thread would be stuck behind the import
+        return "The import queue is full, please try again in a minute.", 503, {"Retry-After": "60"}
+    except sqlite3.Error as e:
+        return database_error(e)
+
+    if request.accept_mimetypes.best == "application/json":
+        return (
+            jsonify({"job_id": job_id, "status_url": url_for("job_status", job_id=job_id)}),
+            202,
+        )
+
+    return render_template(
+        "feedback_msg/import-started.html",
+        class_id=class_id,
+        job_id=job_id,
+    )
+
+
+@app.route("/jobs/<int:job_id>")
+def job_status(job_id):
+    con, cur = connect_to_db()
+    try:
+        job = jobs.status(con, job_id)
+    except sqlite3.Error as e:
+        return database_error(e)
+
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
 @app.route("/advance", methods=["GET", "POST"])
 def advance():
     if request.method == "POST":
@@ -419,21 +550,15 @@ def advance():
         class_id = request.form.get("class_id")
 
         if not class_id:
-            # TODO Error message
-            print("ERROR - NO CLASS ID!")
-
-        page = request.args.get("page", 1, type=int)
-        students, students_per_page, total_pages = fetch_students(class_id, page)
+            app.logger.warning("%s without a class_id", request.path)
+            metrics.record_error("missing_class_id")
 
         return render_template(
             "student/advance-view.html",
-            students=students,
             class_id=class_id,
-            students_per_page=students_per_page,
-            total_pages=total_pages,
-            page=page,
             loggedin=True,
             promotion_view=True,
+            **fetch_students(class_id, *page_args()),
         )
 
 
@@ -442,76 +567,44 @@ def confirm_advance():
     if request.method == "POST":
         class_id = request.form.get("class_id")
         students_ids = request.form.getlist("checked")
-        ids = [int(id) for id in students_ids]
 
         if not students_ids:
             return "NO CHECKED STUDENTS"  # TODO: Add an error message
 
         try:
-            con, cur = connect_to_db()
-
-            # Fetch the existing class details
-            cur.execute("SELECT * FROM class WHERE class_id = (?)", (class_id,))
-            old_class = cur.fetchone()
-
-            if old_class is None:
-                return "CLASS NOT FOUND"
-
-            course, location, year = (
-                old_class[1],
-                old_class[4],
-                old_class[5],
-            )
+            selections = parse_selection(students_ids, class_id)
+        except ValueError:
+            return "NO CHECKED STUDENTS"
 
-            # Archive the old class
-            cur.execute(
-                "UPDATE class SET archived = 1 WHERE class_id = (?)", (class_id,)
-            )
-            con.commit()
+        dry_run = bool(request.form.get("dry_run"))
 
-            # Check for an existing class
-            cur.execute(
-                """
-                SELECT class_id FROM class 
-                WHERE course = ? AND class_type = ? AND location = ? AND year = ?
-                """,
-                (course, "Advanced", location, year),
-            )
-            existing_class = cur.fetchone()
-
-            if existing_class:
-                new_class_id = existing_class[0]
-            else:
-                # Create a new advanced class
-                cur.execute(
-                    """
-                    INSERT INTO class (course, class_type, time_slot, location, year, archived) 
-                    VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (course, "Advanced", "All Day", location, year, 0),
-                )
-                con.commit()
-                new_class_id = cur.lastrowid
+        try:
+            con, cur = connect_to_db()
 
-            # Insert student into the new class, while keeping them in the old one
-            for id in ids:
-                cur.execute(
-                    """
-                    INSERT INTO class_student (class_id, student_id) 
-                    VALUES (?, ?) 
-                    """,
-                    (new_class_id, id),
+            # Every selected class is promoted (or previewed) in one transaction
+            result = promote(con, selections, dry_run=dry_run)
+
+            # Nothing promotable (only Advanced classes) shows the preview, which says why
+            if dry_run or not result["sources"]:
+                return render_template(
+                    "student/advance-preview.html",
+                    class_id=class_id,
+                    checked=students_ids,
+                    result=result,
+                    loggedin=True,
                 )
 
-            con.commit()
+            # The classes promoted from are archived now, their rosters go too
+            forget_classes(*result["sources"])
+            for source_id in result["sources"]:
+                archive.move_to_archive(app.config["DATABASE"], source_id)
 
             return redirect(url_for("homepage"))
 
+        except LookupError:
+            return "CLASS NOT FOUND"
         except sqlite3.Error as e:
-            return f"Database error: {e}"
-
-        finally:
-            con.close()
+            return database_error(e)
 
 
 @app.route("/list", methods=["GET", "POST"])
@@ -522,35 +615,25 @@ def list():
         class_id = request.args.get("class_id")
 
     if not class_id:
-        # TODO Error message
-        print("ERROR - NO CLASS ID!")
-
-    con, cur = connect_to_db()
-    row = cur.execute(
-        "SELECT class_type FROM class WHERE class_id = (?)", (class_id)
-    ).fetchone()
+        app.logger.warning("%s without a class_id", request.path)
+        metrics.record_error("missing_class_id")
 
-    class_type = row["class_type"]
     try:
-        class_type = fetch_class_type(class_id)
-        page = request.args.get("page", 1, type=int)
-        students, students_per_page, total_pages = fetch_students(class_id, page)
-        return render_template(
-            "student/student-list.html",
-            students=students,
-            class_id=class_id,
-            class_type=class_type,
-            students_per_page=students_per_page,
-            total_pages=total_pages,
-            page=page,
-            loggedin=True,
-            is_active_class=True,
+        return cached_page(
+            ("list", class_id),
+            [class_version(class_id)],
+            lambda: render_template(
+                "student/student-list.html",
+                class_id=class_id,
+                class_type=fetch_class_type(class_id),
+                loggedin=True,
+                is_active_class=True,
+                **fetch_students(class_id, *page_args()),
+            ),
         )
 
     except sqlite3.Error as e:
-        return f"Database error: {e}"
-    finally:
-        con.close()
+        return database_error(e)
 
 
 @app.route("/archived_list", methods=["GET", "POST"])
@@ -561,27 +644,23 @@ def archived_list():
         class_id = request.args.get("class_id")
 
     if not class_id:
-        # TODO Error message
-        print("ERROR - NO CLASS ID!")
+        app.logger.warning("%s without a class_id", request.path)
+        metrics.record_error("missing_class_id")
 
-    con, cur = connect_to_db()
     try:
-        page = request.args.get("page", 1, type=int)
-        students, students_per_page, total_pages = fetch_students(class_id, page)
-        return render_template(
-            "archived_classes/archived-student-list.html",
-            students=students,
-            class_id=class_id,
-            students_per_page=students_per_page,
-            total_pages=total_pages,
-            page=page,
-            loggedin=True,
+        return cached_page(
+            ("archived_list", class_id),
+            [class_version(class_id)],
+            lambda: render_template(
+                "archived_classes/archived-student-list.html",
+                class_id=class_id,
+                loggedin=True,
+                **fetch_students(class_id, *page_args()),
+            ),
         )
 
     except sqlite3.Error as e:
-        return f"Database error: {e}"
-    finally:
-        con.close()
+        return database_error(e)
 
 
 @app.route("/advance_list", methods=["GET", "POST"])
@@ -592,28 +671,20 @@ def advance_list():
         class_id = request.args.get("class_id")
 
     if not class_id:
-        # TODO Error message
-        print("ERROR - NO CLASS ID!")
+        app.logger.warning("%s without a class_id", request.path)
+        metrics.record_error("missing_class_id")
 
-    con, cur = connect_to_db()
     try:
-        page = request.args.get("page", 1, type=int)
-        students, students_per_page, total_pages = fetch_students(class_id, page)
         return render_template(
             "student/advance-view.html",
-            students=students,
             class_id=class_id,
-            students_per_page=students_per_page,
-            total_pages=total_pages,
-            page=page,
             loggedin=True,
             promotion_view=True,
+            **fetch_students(class_id, *page_args()),
         )
 
     except sqlite3.Error as e:
-        return f"Database error: {e}"
-    finally:
-        con.close()
+        return database_error(e)
 
 
 #  Student Related Routes
@@ -647,9 +718,7 @@ def edit_student():
             )
 
         except sqlite3.Error as e:
-            return f"Database error: {e}"
-        finally:
-            con.close()
+            return database_error(e)
 
 
 @app.route("/confirm/edit", methods=["GET", "POST"])
@@ -680,7 +749,7 @@ def confirm_edit():
             upd_student = {
                 "student_id": request.form.get("student_id"),
                 "upd_name": request.form.get("name"),
-                "upd_email": request.form.get("email"),
+                "upd_email": normalize_email(request.form.get("email")),
                 "upd_phone": request.form.get("phone"),
                 "upd_location": request.form.get("location"),
                 "upd_class_type": request.form.get("class_type"),
@@ -699,6 +768,7 @@ def confirm_edit():
                     upd_student["student_id"],
                 ),
             )
+            bump_student_classes(cur, [upd_student["student_id"]])
             con.commit()
 
             msg = "You have successfully edited a student."
@@ -707,27 +777,22 @@ def confirm_edit():
                 msg=msg,
                 class_id=class_id,
             )
-        finally:
-            con.close()
+        except sqlite3.Error as e:
+            return database_error(e)
 
 
 @app.route("/add_student", methods=["GET", "POST"])
 def add_student():
     if request.method == "POST":
 
-        con, cur = connect_to_db()
-
         class_id = request.form.get("class_id")
-        class_data = cur.execute(
-            "SELECT location, class_type, course FROM class WHERE class_id = (?)",
-            (class_id),
-        ).fetchone()
+        class_data = fetch_class(class_id)
 
         return render_template(
             "student/add-student.html",
             class_id=class_id,
-            class_type=class_data[1],
-            location=class_data[0],
+            class_type=class_data["class_type"],
+            location=class_data["location"],
             loggedin=True,
         )
 
@@ -751,7 +816,7 @@ def confirm_add():
 
             new_student = {
                 "name": request.form.get("name"),
-                "email": request.form.get("email"),
+                "email": normalize_email(request.form.get("email")),
                 "phone": valid_phone,
                 "location": request.form.get("location"),
                 "course": "Junior Fullstack Developer",
@@ -788,6 +853,7 @@ def confirm_add():
                 "INSERT INTO class_student (class_id, student_id) VALUES (?,?);",
                 (class_id, student_id),
             )
+            bump_roster(cur, class_id)
             con.commit()
 
             msg = "Student has successfully been added."
@@ -796,8 +862,8 @@ def confirm_add():
                 class_id=class_id,
                 msg=msg,
             )
-        finally:
-            con.close()
+        except sqlite3.Error as e:
+            return database_error(e)
 
 
 @app.route("/delete_student", methods=["GET", "POST"])
@@ -815,24 +881,25 @@ def delete_student():
                     (student_id, class_id),
                 )
 
-                cur.execute("DELETE FROM student WHERE student_id = (?)", (student_id,))
+                # Keep the student if they're still enrolled elsewhere (e.g. Advanced)
+                cur.execute(
+                    """DELETE FROM student WHERE student_id = (?) AND NOT EXISTS (
+                    SELECT 1 FROM class_student WHERE class_student.student_id = student.student_id
+                    );""",
+                    (student_id,),
+                )
+                bump_roster(cur, class_id)
                 con.commit()
-            finally:
-                con.close()
+            except sqlite3.Error as e:
+                return database_error(e)
 
         class_type = fetch_class_type(class_id)
-        page = request.args.get("page", 1, type=int)
-        students, students_per_page, total_pages = fetch_students(class_id, page)
-
         return render_template(
             "student/student-list.html",
-            students=students,
             class_id=class_id,
             class_type=class_type,
-            students_per_page=students_per_page,
-            total_pages=total_pages,
-            page=page,
             loggedin=True,
+            **fetch_students(class_id, *page_args()),
         )
 
 
@@ -840,34 +907,28 @@ def delete_student():
 @app.route("/homepage", methods=["GET", "POST"])
 def homepage():
 
-    page = request.args.get("page", 1, type=int)
-    classes, classes_per_page, total_pages = fetch_classes(page)
-
-    return render_template(
-        "homepage/homepage.html",
-        classes=classes,
-        loggedin=True,
-        page=page,
-        classes_per_page=classes_per_page,
-        total_pages=total_pages,
+    return cached_page(
+        ("homepage",),
+        [ACTIVE_CLASSES],
+        lambda: render_template(
+            "homepage/homepage.html",
+            loggedin=True,
+            **fetch_classes(*page_args()),
+        ),
     )
 
 
 @app.route("/archived_classes", methods=["GET", "POST"])
 def archived_classes():
 
-    page = request.args.get("page", 1, type=int)
-    archived_classes, archived_classes_per_page, total_pages = fetch_archived_classes(
-        page
-    )
-
-    return render_template(
-        "archived_classes/archived-classes.html",
-        page=page,
-        archived_classes=archived_classes,
-        archived_classes_per_page=archived_classes_per_page,
-        total_pages=total_pages,
-        loggedin=True,
+    return cached_page(
+        ("archived_classes",),
+        [ARCHIVED_CLASSES],
+        lambda: render_template(
+            "archived_classes/archived-classes.html",
+            loggedin=True,
+            **fetch_archived_classes(*page_args()),
+        ),
     )
 
 
@@ -875,28 +936,25 @@ def archived_classes():
 @app.route("/search")
 def search():
     q = request.args.get("q")
-    if q:
-        con, cur = connect_to_db()
-        query = f"%{q}%"
-        rows = cur.execute(
-            f"SELECT * FROM class WHERE (class_id LIKE (?) OR class_type LIKE (?) OR course LIKE (?) OR location LIKE (?) OR time_slot LIKE (?) OR year LIKE (?)) AND archived = 1",
-            (
-                query,
-                query,
-                query,
-                query,
-                query,
-                query,
-            ),
-        ).fetchall()
-        con.close()
+    scope = request.args.get("scope", "archived")
+    con, cur = connect_to_db()
 
-        results = [dict(row) for row in rows]
-    else:
-        page = request.args.get("page", 1, type=int)
-        archived_classes, archived_classes_per_page, total_pages = (
-            fetch_archived_classes(page)
-        )
-        results = [dict(row) for row in archived_classes]
+    def build():
+        if q:
+            limit = min(request.args.get("limit", SEARCH_LIMIT, type=int), 100)
+            results, next_cursor = search_classes(
+                cur, q, scope, limit, request.args.get("after")
+            )
+        elif scope == "active":
+            ongoing = fetch_classes(*page_args())
+            results, next_cursor = ongoing["classes_per_page"], ongoing["next_cursor"]
+        else:
+            archived = fetch_archived_classes(*page_args())
+            results, next_cursor = archived["archived_classes_per_page"], archived["next_cursor"]
+        return jsonify({"results": results, "next_cursor": next_cursor})
 
-    return jsonify(results)
+    try:
+        # Any write can change what a search finds, so it revalidates on the global counter
+        return conditional(cur, [GLOBAL], build)
+    except sqlite3.Error as e:
+        return database_error(e)
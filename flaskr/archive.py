@@ -0,0 +1,306 @@
+from urllib.parse import quote
+from utils import normalize_email
+from versions import bump_version, class_version, ARCHIVED_CLASSES
+import argparse, os, sqlite3
+
+
+# The archive tier: rosters of archived classes live in their own file, attached
+# read-only to every pooled connection as `archive`. The class row itself stays in
+# the main database (flagged in_archive) so ids, teachers and listings don't move.
+ARCHIVE_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS class (class_id INTEGER PRIMARY KEY, course TEXT, class_type TEXT, time_slot TEXT, location TEXT, year INTEGER);",
+    # Students keep the id they had in the main tables (unless another archived
+    # student already holds it); `student_key` (the email, or the old id when there
+    # is none) is what ties an archived copy back to a live student
+    """CREATE TABLE IF NOT EXISTS student (
+    student_id INTEGER PRIMARY KEY,
+    student_key TEXT NOT NULL UNIQUE,
+    name TEXT,
+    email TEXT,
+    phone TEXT,
+    location TEXT,
+    course TEXT,
+    class_type TEXT
+    );""",
+    "CREATE TABLE IF NOT EXISTS class_student (class_id INTEGER, student_id INTEGER, PRIMARY KEY (class_id, student_id));",
+    "CREATE INDEX IF NOT EXISTS class_student_student_idx ON class_student (student_id, class_id);",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS student_fts USING fts5(
+    name, email, phone,
+    content='student', content_rowid='student_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );""",
+    """CREATE TRIGGER IF NOT EXISTS student_fts_insert AFTER INSERT ON student BEGIN
+    INSERT INTO student_fts (rowid, name, email, phone)
+    VALUES (new.student_id, new.name, new.email, new.phone);
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS student_fts_delete AFTER DELETE ON student BEGIN
+    INSERT INTO student_fts (student_fts, rowid, name, email, phone)
+    VALUES ('delete', old.student_id, old.name, old.email, old.phone);
+    END;""",
+    """CREATE TRIGGER IF NOT EXISTS student_fts_update
+    AFTER UPDATE OF name, email, phone ON student BEGIN
+    INSERT INTO student_fts (student_fts, rowid, name, email, phone)
+    VALUES ('delete', old.student_id, old.name, old.email, old.phone);
+    INSERT INTO student_fts (rowid, name, email, phone)
+    VALUES (new.student_id, new.name, new.email, new.phone);
+    END;""",
+]
+STUDENT_KEY = "COALESCE(NULLIF(s.email, ''), '#' || s.student_id)"
+# Archived students (`a`) with no live row in the main tables - the rest are listed there
+ARCHIVE_ONLY = """NOT EXISTS (SELECT 1 FROM main.student AS m WHERE m.email = lower(a.student_key))
+AND NOT EXISTS (
+    SELECT 1 FROM main.student AS m
+    WHERE a.student_key LIKE '#%' AND m.student_id = CAST(substr(a.student_key, 2) AS INTEGER)
+    AND COALESCE(m.email, '') = ''
+)"""
+
+
+def archive_path(db_path):
+    # database.db -> database-archive.db, unless ARCHIVE_DATABASE says otherwise
+    root, ext = os.path.splitext(db_path)
+    return os.getenv("ARCHIVE_DATABASE") or f"{root}-archive{ext or '.db'}"
+
+
+def init_archive(path):
+    # Rollback journal, not WAL: it is rarely written, and read-only
+    # connections can't open a WAL file whose -shm they aren't allowed to create
+    con = sqlite3.connect(path)
+    try:
+        con.execute("PRAGMA journal_mode = DELETE;")
+        for statement in ARCHIVE_SCHEMA:
+            con.execute(statement)
+        con.commit()
+    finally:
+        con.close()
+
+
+def attach_read_only(con, db_path):
+    # The connection must be opened with uri=True for mode=ro to be honoured.
+    # Not immutable=1: moves write to the file while readers have it open.
+    path = archive_path(db_path)
+    if not os.path.exists(path):
+        init_archive(path)
+    con.execute("ATTACH DATABASE ? AS archive;", (f"file:{quote(os.path.abspath(path))}?mode=ro",))
+
+
+def connect_writer(db_path):
+    con = sqlite3.connect(db_path)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA foreign_keys = ON;")
+    path = archive_path(db_path)
+    if not os.path.exists(path):
+        init_archive(path)
+    con.execute("ATTACH DATABASE ? AS archive;", (path,))
+    return con
+
+
+def tier(cur, class_id):
+    # Table prefix for wherever this class's roster lives
+    row = cur.execute("SELECT in_archive FROM class WHERE class_id = (?);", (class_id,)).fetchone()
+    return "archive." if row and row[0] else ""
+
+
+# Attached databases commit atomically one by one, not together (the main db is WAL),
+# so each move is two transactions: copy, then remove the original. A crash in between
+# leaves a duplicate that the next move overwrites - never a missing roster.
+def move_to_archive(db_path, class_id):
+    con = connect_writer(db_path)
+    try:
+        cur = con.cursor()
+        copied = cur.execute(
+            """INSERT OR REPLACE INTO archive.class (class_id, course, class_type, time_slot, location, year)
+            SELECT class_id, course, class_type, time_slot, location, year FROM main.class
+            WHERE class_id = ? AND archived = 1 AND in_archive = 0;""",
+            (class_id,),
+        ).rowcount
+        if not copied:
+            con.rollback()
+            return False
+
+        copy = f"""INSERT INTO archive.student (student_id, student_key, name, email, phone, location, course, class_type)
+            SELECT {{}}, {STUDENT_KEY}, s.name, s.email, s.phone, s.location, s.course, s.class_type
+            FROM main.class_student AS cs JOIN main.student AS s ON s.student_id = cs.student_id
+            WHERE cs.class_id = ? {{}}
+            ON CONFLICT (student_key) DO UPDATE SET name = excluded.name, phone = excluded.phone;"""
+        # Students whose id is free in the archive keep it. Only then do the others get
+        # new ones, so a new id can't be one that a later student still needs.
+        free = "AND NOT EXISTS (SELECT 1 FROM archive.student AS a WHERE a.student_id = s.student_id)"
+        cur.execute(copy.format("s.student_id", free), (class_id,))
+        cur.execute(copy.format("NULL", ""), (class_id,))
+        cur.execute("DELETE FROM archive.class_student WHERE class_id = ?;", (class_id,))
+        cur.execute(
+            f"""INSERT INTO archive.class_student (class_id, student_id)
+            SELECT cs.class_id, a.student_id FROM main.class_student AS cs
+            JOIN main.student AS s ON s.student_id = cs.student_id
+            JOIN archive.student AS a ON a.student_key = {STUDENT_KEY}
+            WHERE cs.class_id = ?;""",
+            (class_id,),
+        )
+        con.commit()
+
+        # Flagged first, so the counter triggers leave its counts alone while the roster goes.
+        # Students with no other class leave the hot tables; the FK cascade drops their links.
+        cur.execute("UPDATE main.class SET in_archive = 1 WHERE class_id = ?;", (class_id,))
+        cur.execute(
+            """DELETE FROM main.student WHERE student_id IN (
+            SELECT cs.student_id FROM main.class_student AS cs
+            WHERE cs.class_id = ? AND NOT EXISTS (
+                SELECT 1 FROM main.class_student AS other
+                WHERE other.student_id = cs.student_id AND other.class_id != cs.class_id
+            ));""",
+            (class_id,),
+        )
+        cur.execute("DELETE FROM main.class_student WHERE class_id = ?;", (class_id,))
+        bump_version(cur, ARCHIVED_CLASSES, class_version(class_id))
+        con.commit()
+        return True
+    except sqlite3.Error:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+
+def find_live(cur, student):
+    # The student's row in the hot tables, by email or (without one) by their old id
+    if student["email"]:
+        return cur.execute(
+            "SELECT student_id FROM main.student WHERE email = ?;", (normalize_email(student["email"]),)
+        ).fetchone()
+    if student["student_key"].startswith("#"):
+        return cur.execute(
+            "SELECT student_id FROM main.student WHERE student_id = ? AND COALESCE(email, '') = '';",
+            (int(student["student_key"][1:]),),
+        ).fetchone()
+    return None
+
+
+def move_from_archive(db_path, class_id):
+    # Students still (or again) in the hot tables keep their live row; the others
+    # come back under their old id, unless a new student has taken it since
+    con = connect_writer(db_path)
+    try:
+        cur = con.cursor()
+        if not cur.execute(
+            "SELECT 1 FROM main.class WHERE class_id = ? AND in_archive = 1;", (class_id,)
+        ).fetchone():
+            return False
+
+        students = cur.execute(
+            """SELECT a.student_id, a.student_key, a.name, a.email, a.phone, a.location, a.course, a.class_type
+            FROM archive.class_student AS acs JOIN archive.student AS a ON a.student_id = acs.student_id
+            WHERE acs.class_id = ?;""",
+            (class_id,),
+        ).fetchall()
+
+        def restore(student, student_id):
+            return cur.execute(
+                """INSERT INTO main.student (student_id, name, email, phone, location, course, class_type)
+                VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING student_id;""",
+                (student_id, *tuple(student)[2:]),
+            ).fetchone()[0]
+
+        student_ids, renumbered = [], []
+        for student in students:
+            row = find_live(cur, student)
+            if row is not None:
+                student_ids.append(row[0])
+            elif cur.execute("SELECT 1 FROM main.student WHERE student_id = ?;", (student["student_id"],)).fetchone():
+                renumbered.append(student)
+            else:
+                student_ids.append(restore(student, student["student_id"]))
+        # Only once every free old id is back, so a new id can't be one of theirs
+        student_ids += [restore(student, None) for student in renumbered]
+
+        cur.executemany(
+            "INSERT OR IGNORE INTO main.class_student (class_id, student_id) VALUES (?, ?);",
+            [(class_id, student_id) for student_id in student_ids],
+        )
+        # Cleared last: the enrollments above were already in student_count
+        cur.execute("UPDATE main.class SET in_archive = 0 WHERE class_id = ?;", (class_id,))
+        bump_version(cur, ARCHIVED_CLASSES, class_version(class_id))
+        con.commit()
+
+        purge(cur, class_id)
+        con.commit()
+        return True
+    except sqlite3.Error:
+        con.rollback()
+        raise
+    finally:
+        con.close()
+
+
+def recount(db_path):
+    # student_count of classes whose roster is here, for when the counters are rebuilt
+    con = connect_writer(db_path)
+    try:
+        con.execute(
+            """UPDATE main.class SET student_count = (
+            SELECT COUNT(*) FROM archive.class_student AS cs WHERE cs.class_id = main.class.class_id
+            ) WHERE in_archive = 1;"""
+        )
+        con.commit()
+    finally:
+        con.close()
+
+
+def purge(cur, class_id):
+    # Drop a class's archived copy, and archived students nobody else references
+    cur.execute("DELETE FROM archive.class_student WHERE class_id = ?;", (class_id,))
+    cur.execute(
+        """DELETE FROM archive.student WHERE NOT EXISTS (
+        SELECT 1 FROM archive.class_student AS cs WHERE cs.student_id = archive.student.student_id
+        );"""
+    )
+    cur.execute("DELETE FROM archive.class WHERE class_id = ?;", (class_id,))
+
+
+def delete_archived(db_path, class_id):
+    con = connect_writer(db_path)
+    try:
+        purge(con.cursor(), class_id)
+        con.commit()
+    finally:
+        con.close()
+
+
+def sweep(db_path):
+    # Move every archived class that is still in the hot tables
+    con = sqlite3.connect(db_path)
+    class_ids = [
+        row[0]
+        for row in con.execute("SELECT class_id FROM class WHERE archived = 1 AND in_archive = 0;")
+    ]
+    con.close()
+    return [class_id for class_id in class_ids if move_to_archive(db_path, class_id)]
+
+
+def compact(db_path):
+    # Moves leave free pages and FTS segments behind; rewrite the archive file tightly
+    con = sqlite3.connect(archive_path(db_path))
+    try:
+        con.execute("INSERT INTO student_fts (student_fts) VALUES ('optimize');")
+        con.commit()
+        con.execute("VACUUM;")
+    finally:
+        con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the archive tier.")
+    parser.add_argument("--db", default=os.getenv("DATABASE", "database.db"))
+    parser.add_argument("--sweep", action="store_true", help="move archived classes still in the main database")
+    parser.add_argument("--compact", action="store_true", help="VACUUM the archive file")
+    args = parser.parse_args()
+
+    if args.sweep:
+        moved = sweep(args.db)
+        print(f"Moved {len(moved)} classes to {archive_path(args.db)}")
+    if args.compact:
+        compact(args.db)
+        print(f"Compacted {archive_path(args.db)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+from flask import request, url_for
+from markupsafe import Markup, escape
+from compress import precompress
+import argparse, hashlib, io, json, os, re, shutil
+
+
+# `python assets.py` writes content-hashed copies of everything in static/ to
+# static/dist, plus resized AVIF/WebP variants of the images, all listed in
+# static/dist/manifest.json. Without a build, assets are served as they are.
+STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST = "dist"
+MANIFEST = "manifest.json"
+WIDTHS = (160, 320, 640, 960, 1280, 1920, 2560)
+# Pillow format, MIME type, extension, save options - best first
+IMAGE_FORMATS = {
+    ".jpg": ("JPEG", "image/jpeg", ".jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    ".jpeg": ("JPEG", "image/jpeg", ".jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    ".png": ("PNG", "image/png", ".png", {"optimize": True}),
+}
+VARIANT_FORMATS = [
+    ("AVIF", "image/avif", ".avif", {"quality": 50, "speed": 8}),
+    ("WEBP", "image/webp", ".webp", {"quality": 75, "method": 6}),
+]
+IMMUTABLE_SECONDS = 365 * 24 * 3600
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+manifest = {}
+
+
+# Build
+def fingerprint(out_dir, rel, data, suffix="", ext=None):
+    # styles/style.css -> styles/style.3f2a9c01d4.css; the name changes with the content
+    name, original_ext = os.path.splitext(rel)
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    out_rel = f"{name}{suffix}.{digest}{ext or original_ext}".replace(" ", "-")
+    path = os.path.join(out_dir, out_rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return out_rel
+
+
+def encode_image(image, fmt, options):
+    if fmt == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def build_image(out_dir, rel, data):
+    # Pillow is only needed here, never by the running app
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    width, height = image.size
+    fmt, mime, ext, options = IMAGE_FORMATS[os.path.splitext(rel)[1].lower()]
+
+    # Every width the browser may pick, never upscaled
+    widths = [w for w in WIDTHS if w < width] + ([width] if width <= WIDTHS[-1] else [])
+    srcset = {}
+    for w in widths:
+        resized = image if w == width else image.resize((w, round(height * w / width)), Image.LANCZOS)
+        for variant_fmt, variant_mime, variant_ext, variant_options in [*VARIANT_FORMATS, (fmt, mime, ext, options)]:
+            variant = encode_image(resized, variant_fmt, variant_options)
+            out_rel = fingerprint(out_dir, rel, variant, f"-{w}", variant_ext)
+            srcset.setdefault(variant_mime, []).append([out_rel, w])
+
+    return {
+        "file": fingerprint(out_dir, rel, data),
+        "type": mime,
+        "width": width,
+        "height": height,
+        "srcset": srcset,
+    }
+
+
+def minify_css(css, rel, entries):
+    # Comments and whitespace go; url()s point at the fingerprinted files
+    def rewrite(match):
+        target = os.path.normpath(os.path.join(os.path.dirname(rel), match.group(2))).replace(os.sep, "/")
+        entry = entries.get(target)
+        if entry is None:
+            return match.group(0)
+        return f'url("{os.path.relpath(entry["file"], os.path.dirname(rel)).replace(os.sep, "/")}")'
+
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = CSS_URL.sub(rewrite, css)
+    css = re.sub(r"\s+", " ", css)
+    # Not around ":" - "a :hover" and "a:hover" are different selectors
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    # Line-based and conservative: indentation, blank lines and comment-only lines.
+    # Lines inside a multi-line template literal are kept exactly.
+    lines, in_template = [], False
+    for line in js.splitlines():
+        stripped = line if in_template else line.strip()
+        if line.count("`") % 2:
+            in_template = not in_template
+        if not in_template and (not stripped or stripped.startswith("//")):
+            continue
+        lines.append(stripped)
+    js = "\n".join(lines)
+    return re.sub(r"^/\*.*?\*/\n?", "", js, flags=re.S | re.M)
+
+
+def build(static=STATIC):
+    out_dir = os.path.join(static, DIST)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+
+    sources = []
+    for root, dirs, files in os.walk(static):
+        dirs[:] = sorted(name for name in dirs if os.path.join(root, name) != out_dir)
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            sources.append((os.path.relpath(path, static).replace(os.sep, "/"), path))
+
+    entries = {}
+    # Stylesheets last, so the images they reference are already fingerprinted
+    for rel, path in sorted(sources, key=lambda source: source[0].endswith(".css")):
+        with open(path, "rb") as f:
+            data = f.read()
+        ext = os.path.splitext(rel)[1].lower()
+        if ext in IMAGE_FORMATS:
+            entries[rel] = build_image(out_dir, rel, data)
+        elif ext == ".css":
+            css = minify_css(data.decode("utf-8"), rel, entries)
+            entries[rel] = {"file": fingerprint(out_dir, rel, css.encode())}
+        elif ext == ".js":
+            entries[rel] = {"file": fingerprint(out_dir, rel, minify_js(data.decode("utf-8")).encode())}
+        else:
+            entries[rel] = {"file": fingerprint(out_dir, rel, data)}
+
+    # .gz/.br siblings of the CSS and JS, served as they are by compress.CompressionMiddleware
+    precompress(out_dir)
+
+    with open(os.path.join(out_dir, MANIFEST), "w") as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    return entries
+
+
+# Runtime
+def load(static=STATIC):
+    try:
+        with open(os.path.join(static, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def dist_url(file):
+    return url_for("static", filename=f"{DIST}/{file}")
+
+
+def asset_url(path):
+    # The fingerprinted copy if there is a build, the file itself otherwise
+    entry = manifest.get(path)
+    return dist_url(entry["file"]) if entry else url_for("static", filename=path)
+
+
+def srcset(files):
+    return ", ".join(f"{dist_url(file)} {width}w" for file, width in files)
+
+
+def picture(path, alt, sizes="100vw", **attrs):
+    # <picture> with AVIF and WebP sources; `sizes` tells the browser how wide the
+    # image is drawn, so it downloads the smallest variant that is still sharp
+    html_attrs = "".join(
+        f' {escape(name.rstrip("_").replace("_", "-"))}="{escape(value)}"' for name, value in attrs.items()
+    )
+    entry = manifest.get(path)
+    if not entry or "srcset" not in entry:
+        return Markup(f'<img src="{escape(asset_url(path))}" alt="{escape(alt)}"{html_attrs} />')
+
+    sources = "".join(
+        f'<source type="{mime}" srcset="{escape(srcset(entry["srcset"][mime]))}" sizes="{escape(sizes)}" />'
+        for _, mime, _, _ in VARIANT_FORMATS
+    )
+    fallback = entry["srcset"][entry["type"]]
+    return Markup(
+        f'<picture>{sources}<img src="{escape(dist_url(fallback[-1][0]))}" '
+        f'srcset="{escape(srcset(fallback))}" sizes="{escape(sizes)}" '
+        f'width="{entry["width"]}" height="{entry["height"]}" alt="{escape(alt)}" '
+        f'decoding="async"{html_attrs} /></picture>'
+    )
+
+
+def cache_headers(response):
+    # A fingerprinted file never changes under its name, so browsers keep it for a year
+    filename = (request.view_args or {}).get("filename", "")
+    if request.endpoint == "static" and filename.startswith(f"{DIST}/") and response.status_code == 200:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_SECONDS
+        response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    global manifest
+    manifest = load(app.static_folder)
+    app.jinja_env.globals.update(asset_url=asset_url, picture=picture)
+    app.after_request(cache_headers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build fingerprinted, minified and resized static assets.")
+    parser.add_argument("--static", default=STATIC)
+    args = parser.parse_args()
+
+    entries = build(args.static)
+    variants = sum(len(files) for entry in entries.values() for files in entry.get("srcset", {}).values())
+    print(f"Built {len(entries)} assets and {variants} image variants into {os.path.join(args.static, DIST)}")
+
+
+if __name__ == "__main__":
+    main()
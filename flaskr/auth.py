@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import os, threading
+
+
+@lru_cache(maxsize=None)
+def hasher():
+    # argon2 is imported on the first login (or warm-up), not at startup.
+    # Cost parameters default to argon2-cffi's own; raising them only affects
+    # new hashes - old ones get upgraded on the next login.
+    from argon2 import PasswordHasher
+
+    return PasswordHasher(
+        time_cost=int(os.getenv("ARGON2_TIME_COST", "3")),
+        memory_cost=int(os.getenv("ARGON2_MEMORY_COST", "65536")),  # KiB
+        parallelism=int(os.getenv("ARGON2_PARALLELISM", "4")),
+    )
+
+
+LOGIN_WORKERS = int(os.getenv("LOGIN_WORKERS", "2"))
+LOGIN_MAX_PENDING = int(os.getenv("LOGIN_MAX_PENDING", "16"))
+# How long a login may hold its request thread waiting for a free slot; 0 turns it away at once
+LOGIN_WAIT_SECONDS = float(os.getenv("LOGIN_WAIT_SECONDS", "0.5"))
+
+
+class LoginBusy(Exception):
+    pass
+
+
+class PasswordVerifier:
+    # Argon2 is CPU and memory heavy, so at most `workers` hashes run at once and
+    # at most `max_pending` logins wait for one - everyone else is turned away
+    # instead of piling up and starving ordinary page views
+    def __init__(
+        self,
+        hasher=None,
+        workers=LOGIN_WORKERS,
+        max_pending=LOGIN_MAX_PENDING,
+        wait=LOGIN_WAIT_SECONDS,
+    ):
+        self.custom_hasher = hasher
+        self.wait = wait
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def verify(self, password_hash, password):
+        # Returns (matches, new_hash); new_hash is set when the stored hash is outdated
+        if not self.slots.acquire(timeout=self.wait):
+            raise LoginBusy()
+        try:
+            return self.executor.submit(self.check, password_hash, password).result()
+        finally:
+            self.slots.release()
+
+    def check(self, password_hash, password):
+        from argon2.exceptions import VerifyMismatchError
+
+        ph = self.custom_hasher or hasher()
+        try:
+            ph.verify(password_hash, password)
+        except VerifyMismatchError:
+            return False, None
+
+        if ph.check_needs_rehash(password_hash):
+            return True, ph.hash(password)
+        return True, None
@@ -0,0 +1,187 @@
+from itertools import chain
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_cache_control_header
+from werkzeug.security import safe_join
+from werkzeug.wsgi import ClosingIterator
+import argparse, gzip, os, zlib
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+
+# Responses smaller than this aren't worth the CPU (or the gzip header)
+MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 500))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # On the fly; pre-compressed files get the slow, maximal 11
+COMPRESSIBLE = {
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "image/svg+xml",
+}
+PRECOMPRESS = (".css", ".js", ".svg")
+EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+
+
+def gzip_compressor():
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def brotli_compressor():
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+COMPRESSORS = {"gzip": gzip_compressor, "br": brotli_compressor}
+
+
+def negotiate(accept_encoding):
+    # The client's preferred coding we support; brotli wins a tie. None means identity.
+    accepted = parse_accept_header(accept_encoding)
+    options = [(accepted.quality(coding), coding == "br", coding) for coding in ("br", "gzip")]
+    quality, _, coding = max(option for option in options if option[2] != "br" or brotli)
+    return coding if quality > 0 else None
+
+
+def compressible(status, headers, environ):
+    if environ["REQUEST_METHOD"] == "HEAD" or not status.startswith("200"):
+        return False  # Nothing to compress, or a 206 range of the identity body
+    if headers.get("Content-Encoding") or headers.get("Content-Type", "").split(";")[0] not in COMPRESSIBLE:
+        return False  # Already compressed (an export's .gz download, a .br static file) or binary
+    if "no-transform" in parse_cache_control_header(headers.get("Cache-Control")):
+        return False
+    length = headers.get("Content-Length")
+    return length is None or int(length) >= MIN_BYTES
+
+
+def weaken_etag(headers):
+    # Same content, different bytes: a weak validator, as conditional() compares them
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+
+def add_vary(headers):
+    vary = [value.strip() for value in headers.get("Vary", "").split(",") if value.strip()]
+    if "accept-encoding" not in (value.lower() for value in vary):
+        headers["Vary"] = ", ".join([*vary, "Accept-Encoding"])
+
+
+def stream(chunks, compress, flush, finish):
+    # Each chunk is flushed as it comes, so a streamed export still arrives as it is produced
+    for chunk in chunks:
+        data = compress(chunk) + flush() if chunk else b""
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    # gzip or brotli for HTML, JSON, CSV and friends, negotiated from Accept-Encoding.
+    # Streamed (generator) responses are compressed chunk by chunk; static files with
+    # a pre-compressed .br/.gz sibling (see precompress()) are served from it instead.
+    def __init__(self, app, static_folder=None, static_url_path="/static"):
+        self.app = app
+        self.static_folder = static_folder
+        self.static_prefix = static_url_path.rstrip("/") + "/"
+
+    def precompressed(self, path, coding):
+        if not self.static_folder or not path.startswith(self.static_prefix):
+            return None
+        file = safe_join(self.static_folder, path[len(self.static_prefix) :])
+        if file and os.path.isfile(file + EXTENSIONS[coding]):
+            return path + EXTENSIONS[coding]
+        return None
+
+    def __call__(self, environ, start_response):
+        coding = negotiate(environ.get("HTTP_ACCEPT_ENCODING", ""))
+        if coding:
+            # Flask's static handler sets Content-Encoding from the .br/.gz extension
+            path = self.precompressed(environ.get("PATH_INFO", ""), coding)
+            if path:
+                environ = {**environ, "PATH_INFO": path}
+
+        response = {}
+        written = []
+
+        def capture(status, headers, exc_info=None):
+            response.update(status=status, headers=Headers(headers), exc_info=exc_info)
+            return written.append
+
+        app_iter = self.app(environ, capture)
+        close = getattr(app_iter, "close", None)
+        status, headers = response["status"], response["headers"]
+        content_type = headers.get("Content-Type", "").split(";")[0]
+        if content_type in COMPRESSIBLE or headers.get("Content-Encoding"):
+            add_vary(headers)
+
+        if not coding or not compressible(status, headers, environ):
+            if coding and status.startswith("304"):
+                weaken_etag(headers)  # The validator the compressed 200 carried
+            start_response(status, headers.to_wsgi_list(), response["exc_info"])
+            return ClosingIterator(chain(written, app_iter), close) if written else app_iter
+
+        compress, flush, finish = COMPRESSORS[coding]()
+        headers["Content-Encoding"] = coding
+        headers.remove("Accept-Ranges")  # Byte ranges of the identity body don't apply
+        weaken_etag(headers)
+
+        if "Content-Length" in headers:
+            # A complete body: compressed in one go, and it keeps a Content-Length
+            try:
+                data = compress(b"".join(chain(written, app_iter))) + finish()
+            finally:
+                if close:
+                    close()
+            headers["Content-Length"] = str(len(data))
+            start_response(status, headers.to_wsgi_list(), response["exc_info"])
+            return [data]
+
+        start_response(status, headers.to_wsgi_list(), response["exc_info"])
+        return ClosingIterator(stream(chain(written, app_iter), compress, flush, finish), close)
+
+
+def precompress(directory):
+    # Build step: a maximally compressed .gz (and .br) beside each text asset,
+    # so serving them costs no compression at all. Returns the files written.
+    written = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(PRECOMPRESS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            if len(data) < MIN_BYTES:
+                continue
+
+            variants = {".gz": gzip.compress(data, 9, mtime=0)}
+            if brotli:
+                variants[".br"] = brotli.compress(data, quality=11)
+            for ext, compressed in variants.items():
+                if len(compressed) < len(data):
+                    with open(path + ext, "wb") as f:
+                        f.write(compressed)
+                    written.append(path + ext)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-compress the text assets in a directory.")
+    parser.add_argument("directory")
+    args = parser.parse_args()
+
+    written = precompress(args.directory)
+    print(f"Wrote {len(written)} pre-compressed files{'' if brotli else ' (gzip only, brotli is not installed)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from flask import current_app, request
+from versions import version_state
+import datetime, hashlib, os, time
+
+
+RELEASE_FILES = (".py", ".html", ".js", ".css")
+
+release = None
+
+
+def release_stamp():
+    # A deploy changes templates and code without moving any data version, so the
+    # newest source file goes into every tag (and caps Last-Modified from below)
+    global release
+    if release is None:
+        newest = 0.0
+        for root, dirs, files in os.walk(current_app.root_path):
+            dirs[:] = [name for name in dirs if not name.startswith((".", "__"))]
+            for name in files:
+                if name.endswith(RELEASE_FILES):
+                    newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+        release = newest
+    return release
+
+
+def settled(last_modified):
+    # Last-Modified has one-second resolution: while that second lasts, another write
+    # would get the same value, so dates only count once it is over
+    return int(last_modified) + 1 <= time.time()
+
+
+def not_modified(tag, last_modified):
+    # If-None-Match wins when both are sent (RFC 9110 13.2.2), If-Modified-Since is ignored.
+    # A compressed response carries the tag weakened (W/"..."), and it still matches.
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(tag)
+    since = request.if_modified_since
+    return since is not None and settled(last_modified) and int(last_modified) <= since.timestamp()
+
+
+def conditional(cur, versions, build, key=None):
+    # The strong ETag is the page (the URL unless `key` says otherwise) plus the data
+    # versions it is built from, so a revalidation is answered with 304 after one
+    # primary-key read - before any of the real queries or the template run.
+    # `build` returns anything Flask can turn into a response.
+    if request.method not in ("GET", "HEAD"):
+        return current_app.make_response(build())
+
+    state, changed_at = version_state(cur, versions)
+    stamp = release_stamp()
+    tag = hashlib.sha1(f"{stamp}|{key or request.full_path}|{state}".encode()).hexdigest()[:20]
+    last_modified = max(changed_at or 0, stamp)
+
+    if not_modified(tag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(build())
+        if response.status_code != 200:
+            return response
+
+    response.set_etag(tag)
+    # Until then clients revalidate with the ETag alone
+    if settled(last_modified):
+        response.last_modified = datetime.datetime.fromtimestamp(int(last_modified), datetime.timezone.utc)
+    # Stored, but always revalidated: the data can change at any moment
+    response.headers["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,92 @@
+from flask import g
+from metrics import InstrumentedConnection
+from archive import attach_read_only
+from urllib.parse import quote
+import sqlite3, queue, threading
+
+
+# Applied once when a connection is opened, not on every request
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA cache_size = -16000;",  # ~16MB page cache
+    "PRAGMA mmap_size = 268435456;",  # 256MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA foreign_keys = ON;",  # class/student deletes cascade to enrollments
+]
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 8
+
+
+class ConnectionPool:
+    # Keeps idle connections around so a request doesn't pay for sqlite3.connect()
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.idle = queue.LifoQueue(maxsize=size)
+
+    def open(self):
+        # Connections hop between worker threads, but only one request holds each
+        # Opened as a URI so the archive tier can be attached read-only
+        con = sqlite3.connect(
+            f"file:{quote(self.db_path)}",
+            uri=True,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+            factory=InstrumentedConnection,  # Per-request SQL counts for /metrics
+        )
+        con.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            con.execute(pragma)
+        attach_read_only(con, self.db_path)
+        return con
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            return self.open()
+
+    def release(self, con):
+        # Never hand out a connection with a half-finished transaction
+        if con.in_transaction:
+            con.rollback()
+        try:
+            self.idle.put_nowait(con)
+        except queue.Full:
+            con.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    with pools_lock:
+        if db_path not in pools:
+            pools[db_path] = ConnectionPool(db_path)
+        return pools[db_path]
+
+
+def get_db(db_path):
+    # One connection per request, shared by every helper the route calls
+    if "db" not in g:
+        g.db = get_pool(db_path).acquire()
+        g.db_path = db_path
+    return g.db
+
+
+def close_db(e=None):
+    con = g.pop("db", None)
+    if con is not None:
+        get_pool(g.pop("db_path")).release(con)
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -0,0 +1,129 @@
+from flask import Blueprint, current_app, request, abort
+from db import get_pool
+from archive import tier, ARCHIVE_ONLY, STUDENT_KEY
+import csv, io, json, zlib
+
+
+export = Blueprint("export", __name__, url_prefix="/export")
+
+FETCH_ROWS = 1000  # rows pulled from SQLite per step, and rows per chunk sent
+FORMATS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+ROSTER_QUERY = """SELECT s.student_id, s.name, s.email, s.phone, s.location, s.course, s.class_type
+FROM {tier}class_student AS cs JOIN {tier}student AS s ON s.student_id = cs.student_id
+WHERE cs.class_id = ? ORDER BY s.name, s.student_id;"""
+# Ordered the way the indexes already are, so SQLite never sorts (or buffers) the whole export.
+# Archived classes still in the main database come first, then the archive tier's.
+# student_key (the email, or "#" and the old id) identifies a student across both tiers
+ARCHIVED_QUERY = f"""SELECT c.class_id, c.course, c.class_type, c.time_slot, c.location, c.year,
+s.student_id, CASE WHEN s.student_id IS NOT NULL THEN {STUDENT_KEY} END AS student_key, s.name, s.email, s.phone
+FROM class AS c
+LEFT JOIN class_student AS cs ON cs.class_id = c.class_id
+LEFT JOIN student AS s ON s.student_id = cs.student_id
+WHERE c.archived = 1 AND c.in_archive = 0 ORDER BY c.location, c.class_id, cs.student_id;"""
+ARCHIVE_TIER_QUERY = """SELECT c.class_id, c.course, c.class_type, c.time_slot, c.location, c.year,
+s.student_id, s.student_key, s.name, s.email, s.phone
+FROM archive.class AS c
+LEFT JOIN archive.class_student AS cs ON cs.class_id = c.class_id
+LEFT JOIN archive.student AS s ON s.student_id = cs.student_id
+ORDER BY c.class_id, cs.student_id;"""
+# Every student: the main table, then those only the archive tier still has.
+# Ids are only unique within a tier, so a row is addressed by (tier, student_id) -
+# the API's /students/<id> and /students/archive/<id>
+STUDENTS_QUERY = f"""SELECT 'active' AS tier, s.student_id, {STUDENT_KEY} AS student_key,
+s.name, s.email, s.phone, s.location, s.course, s.class_type
+FROM main.student AS s ORDER BY s.student_id;"""
+ARCHIVE_STUDENTS_QUERY = f"""SELECT 'archive' AS tier, a.student_id, a.student_key,
+a.name, a.email, a.phone, a.location, a.course, a.class_type
+FROM archive.student AS a WHERE {ARCHIVE_ONLY} ORDER BY a.student_id;"""
+
+
+def stream_rows(db_path, queries):
+    # Its own pooled connection: the generator outlives the request that started it.
+    # One read transaction, so every query sees the same snapshot of both tiers.
+    # `queries` picks the statements once it has a cursor, e.g. to find a roster's tier.
+    pool = get_pool(db_path)
+    con = pool.acquire()
+    cur = con.cursor()
+    try:
+        cur.execute("BEGIN;")
+        for i, (query, params) in enumerate(queries(cur)):
+            cur.execute(query, params)
+            if i == 0:
+                yield [column[0] for column in cur.description]
+            while rows := cur.fetchmany(FETCH_ROWS):
+                yield rows
+    finally:
+        cur.close()
+        pool.release(con)
+
+
+def encode(chunks, fmt):
+    # Each fetched block becomes one text chunk, so memory stays at one block
+    chunks = iter(chunks)
+    columns = next(chunks)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if fmt == "csv":
+        writer.writerow(columns)
+        yield buffer.getvalue()
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        if fmt == "csv":
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                buffer.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+                buffer.write("\n")
+        yield buffer.getvalue()
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def respond(name, queries):
+    fmt = request.args.get("format", "csv")
+    if fmt not in FORMATS:
+        abort(400, f"format must be one of {', '.join(FORMATS)}")
+
+    body = encode(stream_rows(current_app.config["DATABASE"], queries), fmt)
+    filename = f"{name}.{fmt}"
+    if request.args.get("gzip") == "1":
+        # A .gz file to download, not Content-Encoding - the client keeps it compressed
+        body, content_type = gzipped(body), "application/gzip"
+        filename += ".gz"
+    else:
+        body, content_type = (chunk.encode() for chunk in body), FORMATS[fmt]
+
+    return current_app.response_class(
+        body,
+        content_type=content_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@export.route("/classes/<int:class_id>/students")
+def roster(class_id):
+    return respond(
+        f"class-{class_id}-students",
+        lambda cur: [(ROSTER_QUERY.format(tier=tier(cur, class_id)), (class_id,))],
+    )
+
+
+@export.route("/archived_classes")
+def archived_classes():
+    return respond("archived-classes", lambda cur: [(ARCHIVED_QUERY, ()), (ARCHIVE_TIER_QUERY, ())])
+
+
+@export.route("/students")
+def students():
+    return respond("students", lambda cur: [(STUDENTS_QUERY, ()), (ARCHIVE_STUDENTS_QUERY, ())])
@@ -0,0 +1,290 @@
+from io import TextIOWrapper
+from itertools import islice
+from utils import normalize_email, validate_phone_nums
+from versions import bump_roster, bump_student_classes
+import csv, re
+
+
+BATCH_SIZE = 500  # rows per multi-row UPSERT (6 params each, well under SQLite's limit)
+TRANSACTION_ROWS = 5000  # commit this often so a huge file never holds one giant transaction
+MAX_REJECTS = 1000  # rejects kept for the report, the rest are only counted
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+PHONE_DIGITS = re.compile(r"\D")
+
+
+def read_rows(stream, encoding="latin-1"):
+    # TextIOWrapper pulls the upload in buffered chunks, nothing is read up front
+    reader = csv.reader(TextIOWrapper(stream, encoding=encoding, newline=""))
+    next(reader, None)  # Header
+
+    # Line numbers match the file (the header is line 1)
+    for line, row in enumerate(reader, start=2):
+        if any(field.strip() for field in row):
+            yield line, row
+
+
+def batches(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def clean_batch(batch):
+    # Split a batch into normalized students and rejected rows
+    students, rejects, candidates = {}, [], []
+
+    for line, row in batch:
+        if len(row) < 3:
+            rejects.append({"line": line, "row": row, "reason": "Missing columns"})
+            continue
+
+        name, email, phone = (field.strip() for field in row[:3])
+        email = normalize_email(email)
+
+        if not name:
+            rejects.append({"line": line, "row": row, "reason": "Missing name"})
+        elif not EMAIL_RE.match(email):
+            rejects.append({"line": line, "row": row, "reason": "Invalid email"})
+        else:
+            candidates.append((line, row, name, email, phone))
+
+    # Phones are validated together so repeats and common formats skip libphonenumber
+    phones = validate_phone_nums([candidate[4] for candidate in candidates])
+
+    for (line, row, name, email, _), phone in zip(candidates, phones):
+        if not phone:
+            rejects.append({"line": line, "row": row, "reason": "Invalid phone number"})
+        else:
+            # The last occurrence of an email in the batch wins
+            students[email] = (line, name, phone)
+
+    rejects.sort(key=lambda reject: reject["line"])
+    return students, rejects
+
+
+def write_batch(cur, class_id, class_data, students):
+    # One multi-row UPSERT per batch; RETURNING gives the id of new and existing students alike
+    values = ", ".join("(?, ?, ?, ?, ?, ?)" for _ in students)
+    params = []
+    for email, (line, name, phone) in students.items():
+        params += [
+            name,
+            email,
+            phone,
+            class_data["location"],
+            class_data["course"],
+            class_data["class_type"],
+        ]
+
+    rows = cur.execute(
+        f"""INSERT INTO student (name, email, phone, location, course, class_type)
+        VALUES {values}
+        ON CONFLICT (email) DO UPDATE SET name = excluded.name, phone = excluded.phone
+        RETURNING student_id;""",
+        params,
+    ).fetchall()
+
+    # Existing students may have been updated - refresh the rosters that show them
+    student_ids = [row[0] for row in rows]
+    bump_student_classes(cur, student_ids)
+
+    cur.executemany(
+        "INSERT OR IGNORE INTO class_student (class_id, student_id) VALUES (?, ?);",
+        [(class_id, student_id) for student_id in student_ids],
+    )
+    return len(rows)
+
+
+def find_class(cur, class_id):
+    class_data = cur.execute(
+        # Rosters of classes moved to the archive tier are read-only
+        "SELECT location, class_type, course FROM class WHERE class_id = (?) AND in_archive = 0;",
+        (class_id,),
+    ).fetchone()
+    if class_data is None:
+        raise LookupError(f"Class {class_id} not found")
+    return class_data
+
+
+def count_rejects(report, batch, rejects):
+    report["processed"] += len(batch)
+    report["rejected"] += len(rejects)
+    room = MAX_REJECTS - len(report["rejects"])
+    report["rejects"] += rejects[:room]
+
+
+def import_students(con, class_id, stream, encoding="latin-1", on_progress=None):
+    cur = con.cursor()
+    class_data = find_class(cur, class_id)
+
+    report = {"processed": 0, "imported": 0, "rejected": 0, "rejects": []}
+    pending = 0
+
+    try:
+        for batch in batches(read_rows(stream, encoding)):
+            students, rejects = clean_batch(batch)
+
+            if students:
+                report["imported"] += write_batch(cur, class_id, class_data, students)
+                pending += len(students)
+
+            count_rejects(report, batch, rejects)
+
+            if pending >= TRANSACTION_ROWS:
+                bump_roster(cur, class_id)
+                con.commit()
+                pending = 0
+
+            if on_progress:
+                on_progress(report)
+
+        bump_roster(cur, class_id)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+    return report
+
+
+def phone_key(phone):
+    return PHONE_DIGITS.sub("", phone or "")
+
+
+def roster_index(cur, class_id):
+    # The class's current roster, hashed on normalized email and on phone digits
+    roster = [
+        dict(row)
+        for row in cur.execute(
+            """SELECT s.student_id, s.name, s.email, s.phone FROM class_student AS cs
+            JOIN student AS s ON s.student_id = cs.student_id WHERE cs.class_id = (?);""",
+            (class_id,),
+        )
+    ]
+    by_email = {student["email"].strip().lower(): student for student in roster if student["email"]}
+    by_phone, shared = {}, set()
+    for student in roster:
+        key = phone_key(student["phone"])
+        if key in by_phone:
+            shared.add(key)
+        by_phone[key] = student
+
+    # A phone shared by several students (a family number) identifies none of them
+    for key in shared | {""}:
+        by_phone.pop(key, None)
+    return roster, by_email, by_phone
+
+
+def diff_roster(cur, class_id, incoming, kept):
+    # One pass over the file: match each row by email, then by phone (a changed email)
+    roster, by_email, by_phone = roster_index(cur, class_id)
+    adds, updates, matched, unchanged = {}, {}, set(), 0
+
+    for email, (line, name, phone) in incoming.items():
+        current = by_email.get(email)
+        if current is None:
+            candidate = by_phone.get(phone_key(phone))
+            # Not if that student's own email is also in the file - they match on it
+            if (
+                candidate
+                and candidate["student_id"] not in matched
+                and (candidate["email"] or "").strip().lower() not in incoming
+            ):
+                current = candidate
+        if current is None:
+            adds[email] = (line, name, phone)
+            continue
+
+        matched.add(current["student_id"])
+        if (current["name"], current["email"], current["phone"]) == (name, email, phone):
+            unchanged += 1
+        else:
+            updates[current["student_id"]] = (name, email, phone)
+
+    # A new email that already belongs to another student makes the row theirs, not a rename
+    renames = [email for name, email, phone in updates.values() if email not in by_email]
+    taken = set()
+    for chunk in batches(renames):
+        marks = ", ".join("?" for _ in chunk)
+        rows = cur.execute(f"SELECT email FROM student WHERE email IN ({marks});", chunk)
+        taken.update(row[0] for row in rows)
+    for student_id, (name, email, phone) in list(updates.items()):
+        if email in taken:
+            del updates[student_id]
+            matched.discard(student_id)
+            adds[email] = incoming[email]
+
+    # A rejected row still vouches for its student - a typo shouldn't unenroll anyone.
+    # An empty (or entirely rejected) file looks like a bad export, so it removes nobody.
+    removals = []
+    if incoming:
+        removals = [
+            student["student_id"]
+            for student in roster
+            if student["student_id"] not in matched
+            and (student["email"] or "").strip().lower() not in kept
+        ]
+    return adds, updates, removals, unchanged
+
+
+def unenroll(cur, class_id, student_ids):
+    for chunk in batches(student_ids):
+        marks = ", ".join("?" for _ in chunk)
+        cur.execute(
+            f"DELETE FROM class_student WHERE class_id = ? AND student_id IN ({marks});",
+            (class_id, *chunk),
+        )
+        # Keep students who are still enrolled elsewhere (e.g. Advanced)
+        cur.execute(
+            f"""DELETE FROM student WHERE student_id IN ({marks}) AND NOT EXISTS (
+            SELECT 1 FROM class_student WHERE class_student.student_id = student.student_id
+            );""",
+            chunk,
+        )
+
+
+def sync_students(con, class_id, stream, encoding="latin-1", on_progress=None):
+    # Make the roster match the file (a weekly re-export): the whole file is diffed
+    # in memory, then only the changes are written, in one transaction - an
+    # unchanged file writes nothing at all
+    cur = con.cursor()
+    class_data = find_class(cur, class_id)
+
+    report = {"processed": 0, "imported": 0, "rejected": 0, "rejects": []}
+    incoming, kept = {}, set()
+    for batch in batches(read_rows(stream, encoding)):
+        students, rejects = clean_batch(batch)
+        incoming.update(students)  # The last occurrence of an email in the file wins
+        kept.update(reject["row"][1].strip().lower() for reject in rejects if len(reject["row"]) > 1)
+        count_rejects(report, batch, rejects)
+        if on_progress:
+            on_progress(report)
+
+    adds, updates, removals, unchanged = diff_roster(cur, class_id, incoming, kept)
+    report.update(
+        imported=len(incoming),
+        added=len(adds),
+        updated=len(updates),
+        removed=len(removals),
+        unchanged=unchanged,
+    )
+    if not (adds or updates or removals):
+        return report
+
+    try:
+        for chunk in batches(adds.items()):
+            write_batch(cur, class_id, class_data, dict(chunk))
+        if updates:
+            cur.executemany(
+                "UPDATE student SET name = ?, email = ?, phone = ? WHERE student_id = ?;",
+                [(*student, student_id) for student_id, student in updates.items()],
+            )
+            bump_student_classes(cur, updates)
+        unenroll(cur, class_id, removals)
+        bump_roster(cur, class_id)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+
+    return report
@@ -0,0 +1,142 @@
+from db import get_pool
+from importer import import_students, sync_students
+import json, os, queue, threading, time
+
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+
+
+class JobRunner:
+    # Runs long tasks on a few worker threads fed by a bounded queue,
+    # recording each job in the `job` table so any process can report on it
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.threads = []
+        self.live = {}  # job_id -> progress of jobs running in this process
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.work, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, db_path, kind, class_id, task, cleanup=None):
+        # task(con, on_progress) -> report dict; raises queue.Full when saturated.
+        # The job runs against the database it was submitted for, whatever the app's is by then
+        self.start()
+        pool = get_pool(db_path)
+        con = pool.acquire()
+        try:
+            job_id = con.execute(
+                "INSERT INTO job (kind, status, class_id, created_at) VALUES (?, 'queued', ?, ?);",
+                (kind, class_id, time.time()),
+            ).lastrowid
+            con.commit()
+
+            try:
+                self.queue.put_nowait((job_id, db_path, task, cleanup))
+            except queue.Full:
+                con.execute(
+                    "UPDATE job SET status = 'failed', error = 'Job queue is full' WHERE job_id = (?);",
+                    (job_id,),
+                )
+                con.commit()
+                raise
+        finally:
+            pool.release(con)
+
+        return job_id
+
+    def work(self):
+        while True:
+            job_id, db_path, task, cleanup = self.queue.get()
+            try:
+                self.run(job_id, db_path, task)
+            finally:
+                if cleanup:
+                    cleanup()
+                self.queue.task_done()
+
+    def run(self, job_id, db_path, task):
+        pool = get_pool(db_path)
+        con = pool.acquire()
+        started = time.time()
+        self.live[job_id] = {"status": "running", "started_at": started}
+
+        def on_progress(report):
+            counts = {key: report[key] for key in ("processed", "imported", "rejected")}
+            self.live[job_id].update(counts)
+            # Same connection as the task, so this lands with the task's next commit
+            con.execute(
+                "UPDATE job SET processed = ?, imported = ?, rejected = ? WHERE job_id = ?;",
+                (*counts.values(), job_id),
+            )
+
+        try:
+            con.execute(
+                "UPDATE job SET status = 'running', started_at = ? WHERE job_id = ?;",
+                (started, job_id),
+            )
+            con.commit()
+
+            report = task(con, on_progress)
+            con.execute(
+                """UPDATE job SET status = 'done', processed = ?, imported = ?, rejected = ?,
+                report = ?, finished_at = ? WHERE job_id = ?;""",
+                (
+                    report["processed"],
+                    report["imported"],
+                    report["rejected"],
+                    json.dumps(report),
+                    time.time(),
+                    job_id,
+                ),
+            )
+            con.commit()
+        except Exception as e:
+            con.rollback()
+            con.execute(
+                "UPDATE job SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?;",
+                (str(e), time.time(), job_id),
+            )
+            con.commit()
+        finally:
+            self.live.pop(job_id, None)
+            pool.release(con)
+
+    def status(self, con, job_id):
+        row = con.execute("SELECT * FROM job WHERE job_id = (?);", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["report"] = json.loads(job["report"]) if job["report"] else None
+        # Prefer this process's in-memory counters, the table lags by one transaction
+        job.update(self.live.get(job_id, {}))
+
+        end = job["finished_at"] or time.time()
+        elapsed = end - job["started_at"] if job["started_at"] else 0
+        job["rows_per_sec"] = round(job["processed"] / elapsed) if elapsed else 0
+        return job
+
+
+def submit_import(runner, db_path, class_id, path, encoding="latin-1", sync=False):
+    # The upload is already spooled to `path`; the worker streams it from disk
+    load = sync_students if sync else import_students
+
+    def task(con, on_progress):
+        with open(path, "rb") as f:
+            return load(con, class_id, f, encoding, on_progress)
+
+    def cleanup():
+        os.remove(path)
+
+    try:
+        return runner.submit(db_path, "sync" if sync else "import", class_id, task, cleanup)
+    except BaseException:
+        cleanup()  # Never queued (a full queue, a database error), so no worker will
+        raise
@@ -0,0 +1,269 @@
+from flask import g, request, has_app_context, before_render_template, template_rendered
+import slowlog
+import sqlite3, threading, time
+
+
+# Histogram buckets (upper bounds); every histogram also has +Inf
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+STATEMENT_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+# /metrics only answers requests from these addresses
+LOCAL_ADDRESSES = {"127.0.0.1", "::1"}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    # Counters and histograms keyed by (metric name, labels), rendered as Prometheus text
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help = {}
+        self.counters = {}
+        self.histograms = {}
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, labels, value):
+        # Gauges share the counters' storage, only the TYPE line differs
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = value
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (kind, text) in sorted(self.help.items()):
+                lines += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {value:g}")
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric == name:
+                        lines += render_histogram(name, labels, histogram)
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def render_histogram(name, labels, histogram):
+    lines, total = [], 0
+    for bound, count in zip([*histogram.buckets, "+Inf"], histogram.counts):
+        total += count
+        bucket_labels = (*labels, ("le", f"{bound:g}" if bound != "+Inf" else bound))
+        lines.append(f"{name}_bucket{format_labels(bucket_labels)} {total}")
+    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6g}")
+    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+    return lines
+
+
+registry = Registry()
+registry.describe("flaskr_requests_total", "counter", "Requests by route, method and status.")
+registry.describe("flaskr_request_duration_seconds", "histogram", "Time spent handling a request.")
+registry.describe("flaskr_sql_statements_per_request", "histogram", "SQL statements run by one request.")
+registry.describe("flaskr_sql_duration_seconds", "histogram", "Time one request spent in SQLite.")
+registry.describe("flaskr_sql_rows_fetched_total", "counter", "Rows read back from SQLite.")
+registry.describe("flaskr_template_render_seconds", "histogram", "Time spent rendering templates per request.")
+registry.describe("flaskr_startup_seconds", "gauge", "Time this process took to start, by phase.")
+registry.describe("flaskr_request_errors_total", "counter", "Requests that hit a handled error, by kind.")
+
+
+def stats():
+    # The current request's tally, or None outside a request (jobs, CLI tools)
+    if has_app_context():
+        return g.get("request_metrics")
+    return None
+
+
+# Statements, SQL time and rows are counted around the cursor calls. Not set_trace_callback:
+# it expands the full SQL text for every trigger step, which made a 2,000 row import 17x slower.
+class InstrumentedCursor(sqlite3.Cursor):
+    statement = None
+
+    def execute(self, sql, parameters=()):
+        self.begin(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.finish(start, statements=1)
+
+    def executemany(self, sql, parameters):
+        # One prepared statement, however many parameter sets
+        self.begin(sql, parameters, many=True)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self.finish(start, statements=1)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self.finish(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args):
+        start = time.perf_counter()
+        rows = super().fetchmany(*args)
+        self.finish(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self.finish(start, len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self.finish(start)
+            raise
+        self.finish(start, 1)
+        return row
+
+    def begin(self, sql, parameters, many=False):
+        # A statement's time is its execute plus every fetch, for the slow-query log
+        self.statement = {"sql": sql, "parameters": parameters, "many": many, "seconds": 0.0, "logged": False}
+
+    def finish(self, start, rows=0, statements=0):
+        elapsed = time.perf_counter() - start
+        add_sql_time(elapsed, rows, statements)
+
+        statement = self.statement
+        if slowlog.threshold is None or statement is None:
+            return
+        statement["seconds"] += elapsed
+        if statement["seconds"] >= slowlog.threshold and not statement["logged"]:
+            statement["logged"] = True
+            slowlog.record(
+                self.connection, statement["sql"], statement["parameters"], statement["seconds"], statement["many"]
+            )
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # The C shortcuts would otherwise make a plain cursor
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+def add_sql_time(elapsed, rows=0, statements=0):
+    tally = stats()
+    if tally is not None:
+        tally["sql_seconds"] += elapsed
+        tally["rows"] += rows
+        tally["statements"] += statements
+
+
+def record_error(kind):
+    registry.inc("flaskr_request_errors_total", {"route": route_label(), "kind": kind})
+
+
+def route_label():
+    # The URL rule, not the path, so ids in query strings don't explode the label set
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def start_request():
+    g.request_metrics = {
+        "start": time.perf_counter(),
+        "statements": 0,
+        "sql_seconds": 0.0,
+        "rows": 0,
+        "render_seconds": 0.0,
+    }
+
+
+def finish_request(response):
+    tally = g.pop("request_metrics", None)
+    if tally is None or request.endpoint == "metrics":
+        return response
+
+    route = route_label()
+    labels = {"route": route}
+    registry.inc(
+        "flaskr_requests_total",
+        {**labels, "method": request.method, "status": response.status_code},
+    )
+    registry.observe(
+        "flaskr_request_duration_seconds",
+        {**labels, "method": request.method},
+        time.perf_counter() - tally["start"],
+    )
+    registry.observe("flaskr_sql_statements_per_request", labels, tally["statements"], STATEMENT_BUCKETS)
+    registry.observe("flaskr_sql_duration_seconds", labels, tally["sql_seconds"])
+    registry.inc("flaskr_sql_rows_fetched_total", labels, tally["rows"])
+    if tally["render_seconds"]:
+        registry.observe("flaskr_template_render_seconds", labels, tally["render_seconds"])
+    return response
+
+
+# Blinker holds receivers weakly - these must be module-level functions, not lambdas
+def render_started(sender, template, context, **extra):
+    tally = stats()
+    if tally is not None:
+        tally["render_start"] = time.perf_counter()
+
+
+def render_finished(sender, template, context, **extra):
+    tally = stats()
+    if tally is not None and "render_start" in tally:
+        tally["render_seconds"] += time.perf_counter() - tally.pop("render_start")
+
+
+def metrics_view():
+    if request.remote_addr not in LOCAL_ADDRESSES:
+        return "Not Found", 404
+    return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+def init_app(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    before_render_template.connect(render_started, app)
+    template_rendered.connect(render_finished, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
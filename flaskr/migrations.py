@@ -0,0 +1,461 @@
+import sqlite3, datetime, argparse, sys
+
+
+# Rebuild every trigger-maintained counter from the tables they summarize.
+# Rosters in the archive tier are counted by archive.recount().
+RECOUNT = [
+    "DELETE FROM class_count;",
+    # class_count's key can't hold NULL (WITHOUT ROWID), so NULL is counted under '': a class
+    # without a location still adds to its listing's total, one without an archived flag (listed
+    # on neither page) to neither
+    """INSERT INTO class_count (archived, location, classes)
+    SELECT COALESCE(archived, ''), COALESCE(location, ''), COUNT(*) FROM class GROUP BY 1, 2;""",
+    """UPDATE class SET student_count = (
+    SELECT COUNT(*) FROM class_student AS cs WHERE cs.class_id = class.class_id
+    ) WHERE in_archive = 0;""",
+    """UPDATE class SET promoted_count = (
+    SELECT COUNT(*) FROM promotion AS p WHERE p.class_id = class.class_id
+    );""",
+]
+
+
+# Each migration runs once, in order, inside its own transaction.
+# Never edit a migration that has shipped - append a new one instead.
+MIGRATIONS = [
+    (
+        1,
+        "initial schema",
+        [
+            "CREATE TABLE IF NOT EXISTS teacher (teacher_id INTEGER PRIMARY KEY, name TEXT, email TEXT UNIQUE, password TEXT, class_id INTEGER, FOREIGN KEY (class_id) REFERENCES class(class_id));",
+            "CREATE TABLE IF NOT EXISTS class (class_id INTEGER PRIMARY KEY, course TEXT, class_type TEXT, time_slot TEXT, location TEXT, year INTEGER, archived INTEGER);",
+            """CREATE TABLE IF NOT EXISTS student (
+            student_id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT UNIQUE,
+            phone TEXT,
+            location TEXT,
+            course TEXT,
+            class_type TEXT,
+            teacher_id INTEGER,
+            FOREIGN KEY (teacher_id) REFERENCES teacher(teacher_id)
+            );""",
+            "CREATE TABLE IF NOT EXISTS class_student (class_id INTEGER, student_id INTEGER, PRIMARY KEY (class_id, student_id), FOREIGN KEY (class_id) REFERENCES class(class_id), FOREIGN KEY (student_id) REFERENCES student(student_id));",
+            "CREATE TABLE IF NOT EXISTS class_teacher (class_id INTEGER, teacher_id INTEGER, PRIMARY KEY (class_id, teacher_id), FOREIGN KEY (class_id) REFERENCES class(class_id), FOREIGN KEY (teacher_id) REFERENCES teacher(teacher_id));",
+        ],
+    ),
+    (
+        2,
+        "indexes for the homepage, roster and advancement queries",
+        [
+            # Homepage / archived list: WHERE archived = ? ORDER BY location, class_id
+            # (class_id is the rowid, so it is already the last key of the index)
+            "CREATE INDEX IF NOT EXISTS class_archived_location_idx ON class (archived, location);",
+            # delete_student and the advancement flow look up enrollments by student
+            "CREATE INDEX IF NOT EXISTS class_student_student_idx ON class_student (student_id, class_id);",
+            # confirm_advance looks for an existing Advanced class - covering, returns the rowid
+            "CREATE INDEX IF NOT EXISTS class_cohort_idx ON class (course, class_type, location, year);",
+            "ANALYZE;",
+        ],
+    ),
+    (
+        3,
+        "full-text search over classes and students",
+        [
+            # External content tables - the text stays in class/student, FTS only keeps the index
+            """CREATE VIRTUAL TABLE IF NOT EXISTS class_fts USING fts5(
+            class_type, course, location, time_slot, year,
+            content='class', content_rowid='class_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );""",
+            """CREATE VIRTUAL TABLE IF NOT EXISTS student_fts USING fts5(
+            name, email, phone,
+            content='student', content_rowid='student_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );""",
+            """CREATE TRIGGER IF NOT EXISTS class_fts_insert AFTER INSERT ON class BEGIN
+            INSERT INTO class_fts (rowid, class_type, course, location, time_slot, year)
+            VALUES (new.class_id, new.class_type, new.course, new.location, new.time_slot, new.year);
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS class_fts_delete AFTER DELETE ON class BEGIN
+            INSERT INTO class_fts (class_fts, rowid, class_type, course, location, time_slot, year)
+            VALUES ('delete', old.class_id, old.class_type, old.course, old.location, old.time_slot, old.year);
+            END;""",
+            # Archiving only touches `archived`, which isn't indexed, so it doesn't fire this
+            """CREATE TRIGGER IF NOT EXISTS class_fts_update
+            AFTER UPDATE OF class_type, course, location, time_slot, year ON class BEGIN
+            INSERT INTO class_fts (class_fts, rowid, class_type, course, location, time_slot, year)
+            VALUES ('delete', old.class_id, old.class_type, old.course, old.location, old.time_slot, old.year);
+            INSERT INTO class_fts (rowid, class_type, course, location, time_slot, year)
+            VALUES (new.class_id, new.class_type, new.course, new.location, new.time_slot, new.year);
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS student_fts_insert AFTER INSERT ON student BEGIN
+            INSERT INTO student_fts (rowid, name, email, phone)
+            VALUES (new.student_id, new.name, new.email, new.phone);
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS student_fts_delete AFTER DELETE ON student BEGIN
+            INSERT INTO student_fts (student_fts, rowid, name, email, phone)
+            VALUES ('delete', old.student_id, old.name, old.email, old.phone);
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS student_fts_update
+            AFTER UPDATE OF name, email, phone ON student BEGIN
+            INSERT INTO student_fts (student_fts, rowid, name, email, phone)
+            VALUES ('delete', old.student_id, old.name, old.email, old.phone);
+            INSERT INTO student_fts (rowid, name, email, phone)
+            VALUES (new.student_id, new.name, new.email, new.phone);
+            END;""",
+            # Index whatever is already in the tables
+            "INSERT INTO class_fts (class_fts) VALUES ('rebuild');",
+            "INSERT INTO student_fts (student_fts) VALUES ('rebuild');",
+        ],
+    ),
+    (
+        4,
+        "background job table",
+        [
+            """CREATE TABLE IF NOT EXISTS job (
+            job_id INTEGER PRIMARY KEY,
+            kind TEXT,
+            status TEXT,
+            class_id INTEGER,
+            processed INTEGER DEFAULT 0,
+            imported INTEGER DEFAULT 0,
+            rejected INTEGER DEFAULT 0,
+            report TEXT,
+            error TEXT,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL
+            );""",
+        ],
+    ),
+    (
+        5,
+        "cascade deletes from class and student",
+        [
+            # SQLite can't alter a foreign key, so the tables are rebuilt.
+            # Rows pointing at classes/students that no longer exist are dropped on the way.
+            """CREATE TABLE class_student_new (
+            class_id INTEGER,
+            student_id INTEGER,
+            PRIMARY KEY (class_id, student_id),
+            FOREIGN KEY (class_id) REFERENCES class(class_id) ON DELETE CASCADE,
+            FOREIGN KEY (student_id) REFERENCES student(student_id) ON DELETE CASCADE
+            );""",
+            """INSERT INTO class_student_new (class_id, student_id)
+            SELECT cs.class_id, cs.student_id FROM class_student AS cs
+            WHERE EXISTS (SELECT 1 FROM class WHERE class.class_id = cs.class_id)
+            AND EXISTS (SELECT 1 FROM student WHERE student.student_id = cs.student_id);""",
+            "DROP TABLE class_student;",
+            "ALTER TABLE class_student_new RENAME TO class_student;",
+            "CREATE INDEX IF NOT EXISTS class_student_student_idx ON class_student (student_id, class_id);",
+            """CREATE TABLE class_teacher_new (
+            class_id INTEGER,
+            teacher_id INTEGER,
+            PRIMARY KEY (class_id, teacher_id),
+            FOREIGN KEY (class_id) REFERENCES class(class_id) ON DELETE CASCADE,
+            FOREIGN KEY (teacher_id) REFERENCES teacher(teacher_id) ON DELETE CASCADE
+            );""",
+            """INSERT INTO class_teacher_new (class_id, teacher_id)
+            SELECT ct.class_id, ct.teacher_id FROM class_teacher AS ct
+            WHERE EXISTS (SELECT 1 FROM class WHERE class.class_id = ct.class_id)
+            AND EXISTS (SELECT 1 FROM teacher WHERE teacher.teacher_id = ct.teacher_id);""",
+            "DROP TABLE class_teacher;",
+            "ALTER TABLE class_teacher_new RENAME TO class_teacher;",
+            # A teacher outlives the class they were created with
+            """CREATE TABLE teacher_new (
+            teacher_id INTEGER PRIMARY KEY,
+            name TEXT,
+            email TEXT UNIQUE,
+            password TEXT,
+            class_id INTEGER,
+            FOREIGN KEY (class_id) REFERENCES class(class_id) ON DELETE SET NULL
+            );""",
+            """INSERT INTO teacher_new (teacher_id, name, email, password, class_id)
+            SELECT teacher_id, name, email, password,
+            (SELECT class_id FROM class WHERE class.class_id = teacher.class_id)
+            FROM teacher;""",
+            "DROP TABLE teacher;",
+            "ALTER TABLE teacher_new RENAME TO teacher;",
+        ],
+    ),
+    (
+        6,
+        "data version counters for cache invalidation",
+        [
+            "CREATE TABLE IF NOT EXISTS data_version (name TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID;",
+        ],
+    ),
+    (
+        7,
+        "archive tier flag",
+        [
+            # 1 once the class's roster has moved to the archive file (see archive.py)
+            "ALTER TABLE class ADD COLUMN in_archive INTEGER NOT NULL DEFAULT 0;",
+        ],
+    ),
+    (
+        8,
+        "trigger-maintained enrollment counters",
+        [
+            "ALTER TABLE class ADD COLUMN student_count INTEGER NOT NULL DEFAULT 0;",
+            "ALTER TABLE class ADD COLUMN promoted_count INTEGER NOT NULL DEFAULT 0;",
+            # Listing totals: one row per (archived, location) instead of a COUNT over class
+            "CREATE TABLE IF NOT EXISTS class_count (archived INTEGER, location TEXT, classes INTEGER NOT NULL, PRIMARY KEY (archived, location)) WITHOUT ROWID;",
+            # Who was advanced from which class, and into which Advanced class. No student
+            # foreign key: archive moves take students out of the main tables, not their history.
+            """CREATE TABLE IF NOT EXISTS promotion (
+            class_id INTEGER,
+            student_id INTEGER,
+            target_id INTEGER,
+            PRIMARY KEY (class_id, student_id),
+            FOREIGN KEY (class_id) REFERENCES class(class_id) ON DELETE CASCADE,
+            FOREIGN KEY (target_id) REFERENCES class(class_id) ON DELETE CASCADE
+            );""",
+            "CREATE INDEX IF NOT EXISTS promotion_target_idx ON promotion (target_id, student_id);",
+            # Past promotions: students of a class also enrolled in their cohort's Advanced class
+            """INSERT OR IGNORE INTO promotion (class_id, student_id, target_id)
+            SELECT source.class_id, cs.student_id, MIN(target.class_id)
+            FROM class AS source
+            JOIN class_student AS cs ON cs.class_id = source.class_id
+            JOIN class_student AS enrolled ON enrolled.student_id = cs.student_id
+            JOIN class AS target ON target.class_id = enrolled.class_id
+            WHERE source.class_type != 'Advanced' AND target.class_type = 'Advanced'
+            AND (target.course, target.location, target.year) = (source.course, source.location, source.year)
+            GROUP BY source.class_id, cs.student_id;""",
+            """CREATE TRIGGER IF NOT EXISTS class_count_insert AFTER INSERT ON class BEGIN
+            INSERT INTO class_count (archived, location, classes) VALUES (new.archived, new.location, 1)
+            ON CONFLICT (archived, location) DO UPDATE SET classes = classes + 1;
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS class_count_delete AFTER DELETE ON class BEGIN
+            UPDATE class_count SET classes = classes - 1
+            WHERE archived = old.archived AND location = old.location;
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS class_count_update AFTER UPDATE OF archived, location ON class
+            WHEN old.archived IS NOT new.archived OR old.location IS NOT new.location BEGIN
+            UPDATE class_count SET classes = classes - 1
+            WHERE archived = old.archived AND location = old.location;
+            INSERT INTO class_count (archived, location, classes) VALUES (new.archived, new.location, 1)
+            ON CONFLICT (archived, location) DO UPDATE SET classes = classes + 1;
+            END;""",
+            # Classes flagged in_archive keep their counts while archive.py moves their roster
+            """CREATE TRIGGER IF NOT EXISTS class_student_count_insert AFTER INSERT ON class_student BEGIN
+            UPDATE class SET student_count = student_count + 1
+            WHERE class_id = new.class_id AND in_archive = 0;
+            END;""",
+            # Leaving an Advanced class undoes the promotion into it
+            """CREATE TRIGGER IF NOT EXISTS class_student_count_delete AFTER DELETE ON class_student BEGIN
+            UPDATE class SET student_count = student_count - 1
+            WHERE class_id = old.class_id AND in_archive = 0;
+            DELETE FROM promotion WHERE target_id = old.class_id AND student_id = old.student_id
+            AND NOT EXISTS (SELECT 1 FROM class WHERE class_id = old.class_id AND in_archive = 1);
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS promotion_count_insert AFTER INSERT ON promotion BEGIN
+            UPDATE class SET promoted_count = promoted_count + 1 WHERE class_id = new.class_id;
+            END;""",
+            """CREATE TRIGGER IF NOT EXISTS promotion_count_delete AFTER DELETE ON promotion BEGIN
+            UPDATE class SET promoted_count = promoted_count - 1 WHERE class_id = old.class_id;
+            END;""",
+            *RECOUNT,
+        ],
+    ),
+    (
+        9,
+        "data version timestamps",
+        [
+            # Unix time of the last bump, for Last-Modified; NULL until the next one
+            "ALTER TABLE data_version ADD COLUMN changed_at REAL;",
+        ],
+    ),
+    (
+        10,
+        "lowercase student emails",
+        [
+            # Imports upsert on the lowercased email, but the forms stored it as typed.
+            # Students whose emails differ only in case are merged into the oldest first.
+            """CREATE TEMP TABLE email_keeper AS
+            SELECT lower(trim(email)) AS email, MIN(student_id) AS keeper FROM student
+            WHERE trim(email) != '' GROUP BY lower(trim(email)) HAVING COUNT(*) > 1;""",
+            """CREATE TEMP TABLE email_duplicate AS
+            SELECT s.student_id, k.keeper FROM student AS s
+            JOIN email_keeper AS k ON k.email = lower(trim(s.email)) WHERE s.student_id != k.keeper;""",
+            """INSERT OR IGNORE INTO class_student (class_id, student_id)
+            SELECT cs.class_id, d.keeper FROM class_student AS cs
+            JOIN email_duplicate AS d ON d.student_id = cs.student_id;""",
+            """INSERT OR IGNORE INTO promotion (class_id, student_id, target_id)
+            SELECT p.class_id, d.keeper, p.target_id FROM promotion AS p
+            JOIN email_duplicate AS d ON d.student_id = p.student_id;""",
+            "DELETE FROM class_student WHERE student_id IN (SELECT student_id FROM email_duplicate);",
+            "DELETE FROM promotion WHERE student_id IN (SELECT student_id FROM email_duplicate);",
+            "DELETE FROM student WHERE student_id IN (SELECT student_id FROM email_duplicate);",
+            "UPDATE student SET email = lower(trim(email)) WHERE email != lower(trim(email));",
+            "DROP TABLE email_duplicate;",
+            "DROP TABLE email_keeper;",
+        ],
+    ),
+    (
+        11,
+        "class_count triggers for NULL archived or location",
+        [
+            # Migration 8's triggers failed the insert of a class without a location
+            "DROP TRIGGER IF EXISTS class_count_insert;",
+            "DROP TRIGGER IF EXISTS class_count_delete;",
+            "DROP TRIGGER IF EXISTS class_count_update;",
+            """CREATE TRIGGER class_count_insert AFTER INSERT ON class BEGIN
+            INSERT INTO class_count (archived, location, classes)
+            VALUES (COALESCE(new.archived, ''), COALESCE(new.location, ''), 1)
+            ON CONFLICT (archived, location) DO UPDATE SET classes = classes + 1;
+            END;""",
+            """CREATE TRIGGER class_count_delete AFTER DELETE ON class BEGIN
+            UPDATE class_count SET classes = classes - 1
+            WHERE archived = COALESCE(old.archived, '') AND location = COALESCE(old.location, '');
+            END;""",
+            """CREATE TRIGGER class_count_update AFTER UPDATE OF archived, location ON class
+            WHEN old.archived IS NOT new.archived OR old.location IS NOT new.location BEGIN
+            UPDATE class_count SET classes = classes - 1
+            WHERE archived = COALESCE(old.archived, '') AND location = COALESCE(old.location, '');
+            INSERT INTO class_count (archived, location, classes)
+            VALUES (COALESCE(new.archived, ''), COALESCE(new.location, ''), 1)
+            ON CONFLICT (archived, location) DO UPDATE SET classes = classes + 1;
+            END;""",
+            *RECOUNT,
+        ],
+    ),
+]
+
+# Hot queries whose plans must not contain a full scan, with sample parameters
+HOT_QUERIES = {
+    "homepage count": ("SELECT SUM(classes) FROM class_count WHERE archived = ?;", (0,)),
+    "homepage page": (
+        "SELECT class_id, course, class_type, time_slot, location, year, archived FROM class WHERE archived = ? AND (location, class_id) > (?, ?) ORDER BY location, class_id LIMIT ?;",
+        (0, "", 0, 9),
+    ),
+    "roster count": ("SELECT in_archive, student_count FROM class WHERE class_id = ?;", (1,)),
+    "roster page": (
+        "SELECT s.student_id, s.name, s.email, s.phone, s.location, s.course, s.class_type FROM class_student AS cs JOIN student AS s ON s.student_id = cs.student_id WHERE cs.class_id = ? AND (s.name, s.student_id) > (?, ?) ORDER BY s.name, s.student_id LIMIT ?;",
+        (1, "", 0, 9),
+    ),
+    "class type": ("SELECT class_type FROM class WHERE class_id = ?;", (1,)),
+    "student enrollments": (
+        "SELECT class_id FROM class_student WHERE student_id = ?;",
+        (1,),
+    ),
+    "delete student": (
+        "DELETE FROM class_student WHERE student_id = ? AND class_id = ?;",
+        (1, 1),
+    ),
+    "search classes": (
+        "SELECT rowid, bm25(class_fts) FROM class_fts WHERE class_fts MATCH ? ORDER BY rank LIMIT ?;",
+        ('"lis"*', 100),
+    ),
+    "search students": (
+        "SELECT cs.class_id FROM student_fts JOIN class_student AS cs ON cs.student_id = student_fts.rowid WHERE student_fts MATCH ?;",
+        ('"ana"*',),
+    ),
+    "undo promotion": (
+        "DELETE FROM promotion WHERE target_id = ? AND student_id = ?;",
+        (1, 1),
+    ),
+    "orphaned students": (
+        "SELECT student_id FROM class_student AS cs WHERE cs.class_id = ? AND NOT EXISTS (SELECT 1 FROM class_student AS other WHERE other.student_id = cs.student_id AND other.class_id != cs.class_id);",
+        (1,),
+    ),
+    "advanced class lookup": (
+        "SELECT class_id FROM class WHERE course = ? AND class_type = ? AND location = ? AND year = ?;",
+        ("Junior Fullstack Developer", "Advanced", "Lisbon", 2024),
+    ),
+}
+
+
+def applied_versions(con):
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name TEXT, applied_at TEXT);"
+    )
+    rows = con.execute("SELECT version FROM schema_migrations;").fetchall()
+    return {row[0] for row in rows}
+
+
+def migrate(con):
+    # Apply every pending migration, returns the versions that were applied
+    done = applied_versions(con)
+    con.commit()
+    applied = []
+
+    for version, name, statements in MIGRATIONS:
+        if version in done:
+            continue
+
+        try:
+            con.execute("BEGIN;")
+            for statement in statements:
+                con.execute(statement)
+            con.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?);",
+                (version, name, datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+            con.commit()
+        except sqlite3.Error:
+            con.rollback()
+            raise
+        applied.append(version)
+
+    return applied
+
+
+def migrate_db(db_path):
+    con = sqlite3.connect(db_path)
+    try:
+        applied = migrate(con)
+    finally:
+        con.close()
+    if 8 in applied:
+        # The counter migration can't see the archive file
+        from archive import recount
+
+        recount(db_path)
+    return applied
+
+
+def full_scans(con, queries=HOT_QUERIES):
+    # EXPLAIN QUERY PLAN every hot query and keep the steps that scan a whole table/index
+    scans = {}
+    for label, (query, params) in queries.items():
+        plan = con.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        # An FTS5 MATCH shows up as "SCAN ... VIRTUAL TABLE INDEX", which is an index lookup
+        steps = [
+            row[3]
+            for row in plan
+            if row[3].startswith("SCAN") and "VIRTUAL TABLE INDEX" not in row[3]
+        ]
+        if steps:
+            scans[label] = steps
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations.")
+    parser.add_argument("--db", default="database.db")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="fail if a hot query's plan contains a full scan",
+    )
+    args = parser.parse_args()
+
+    con = sqlite3.connect(args.db)
+    try:
+        applied = migrate(con)
+        print(f"Applied migrations: {applied or 'none (up to date)'}")
+
+        if args.check:
+            scans = full_scans(con)
+            for label, steps in scans.items():
+                print(f"FULL SCAN - {label}: {'; '.join(steps)}")
+            if scans:
+                sys.exit(1)
+            print(f"No full scans in {len(HOT_QUERIES)} hot queries.")
+    finally:
+        con.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import base64, json
+
+
+PER_PAGE = 8
+
+
+# Cursors are the sort key of a page's first/last row, made opaque for the URL
+def encode_cursor(row, order_by):
+    key = [row[column.split(".")[-1]] for column in order_by]
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, order_by):
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        return None
+
+    # A tampered cursor falls back to offset paging instead of failing
+    if not isinstance(key, list) or len(key) != len(order_by):
+        return None
+    if not all(value is None or isinstance(value, (str, int, float)) for value in key):
+        return None  # Nested lists/objects can't be bound as SQL parameters
+    return key
+
+
+def count_pages(total, per_page=PER_PAGE):
+    return max((total + per_page - 1) // per_page, 1)
+
+
+def keyset_page(
+    cur,
+    select,
+    where,
+    params,
+    order_by,
+    page=1,
+    after=None,
+    before=None,
+    per_page=PER_PAGE,
+):
+    # Seek past the cursor with a row-value comparison on the ORDER BY keys,
+    # so SQLite only ever reads one page worth of rows from the index
+    keys = ", ".join(order_by)
+    marks = ", ".join("?" for _ in order_by)
+    after_key = decode_cursor(after, order_by)
+    before_key = decode_cursor(before, order_by)
+
+    if after_key is not None:
+        query = f"{select} WHERE {where} AND ({keys}) > ({marks}) ORDER BY {keys} LIMIT ?"
+        rows = cur.execute(query, (*params, *after_key, per_page + 1)).fetchall()
+        has_prev, has_next = True, len(rows) > per_page
+        rows = rows[:per_page]
+    elif before_key is not None:
+        desc = ", ".join(f"{column} DESC" for column in order_by)
+        query = f"{select} WHERE {where} AND ({keys}) < ({marks}) ORDER BY {desc} LIMIT ?"
+        rows = cur.execute(query, (*params, *before_key, per_page + 1)).fetchall()
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        # No cursor (first visit or a typed-in ?page=) - plain OFFSET
+        offset = (max(page, 1) - 1) * per_page
+        query = f"{select} WHERE {where} ORDER BY {keys} LIMIT ? OFFSET ?"
+        rows = cur.execute(query, (*params, per_page + 1, offset)).fetchall()
+        has_prev, has_next = offset > 0, len(rows) > per_page
+        rows = rows[:per_page]
+
+    items = [dict(row) for row in rows]
+    next_cursor = encode_cursor(items[-1], order_by) if items and has_next else None
+    prev_cursor = encode_cursor(items[0], order_by) if items and has_prev else None
+
+    return items, next_cursor, prev_cursor
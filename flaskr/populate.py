@@ -1,133 +1,288 @@
-import sqlite3
-import random
-from utils import validate_phone_num
-from argon2 import PasswordHasher
-from faker import Faker
-
-
-db_path = "database.db"
-con = sqlite3.connect(db_path)
-cur = con.cursor()
-ph = PasswordHasher()
-
-
-# Main function for the database - Create tables, then populate them
-def initialize_db():
-    create_tables()
-    populate_db()
-
-
-# Handler functions for the database
-def create_tables():
-    queries = [
-        # Teacher table
-        "CREATE TABLE IF NOT EXISTS teacher (teacher_id INTEGER PRIMARY KEY, name TEXT, email TEXT UNIQUE, password TEXT, class_id INTEGER, FOREIGN KEY (class_id) REFERENCES class(class_id));",
-        # Class table
-        "CREATE TABLE IF NOT EXISTS class (class_id INTEGER PRIMARY KEY, course TEXT, class_type TEXT, time_slot TEXT, location TEXT, year INTEGER, archived INTEGER);",
-        # Student table
-        """CREATE TABLE IF NOT EXISTS student (
-        student_id INTEGER PRIMARY KEY, 
-        name TEXT, 
-        email TEXT UNIQUE, 
-        phone TEXT, 
-        location TEXT, 
-        course TEXT, 
-        class_type TEXT, 
-        teacher_id INTEGER,
-        FOREIGN KEY (teacher_id) REFERENCES teacher(teacher_id)
-        );""",
-        # Class_student junction table
-        "CREATE TABLE IF NOT EXISTS class_student (class_id INTEGER, student_id INTEGER, PRIMARY KEY (class_id, student_id), FOREIGN KEY (class_id) REFERENCES class(class_id), FOREIGN KEY (student_id) REFERENCES student(student_id));",
-        # Class_teacher junction table
-        "CREATE TABLE IF NOT EXISTS class_teacher (class_id INTEGER, teacher_id INTEGER, PRIMARY KEY (class_id, teacher_id), FOREIGN KEY (class_id) REFERENCES class(class_id), FOREIGN KEY (teacher_id) REFERENCES teacher(teacher_id));",
-    ]
+import argparse, os, random, sqlite3, time, unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from migrations import migrate, RECOUNT
+from archive import archive_path
+from utils import LOCATIONS, COURSES, TIME_SLOTS
+from versions import bump_version, ACTIVE_CLASSES, ARCHIVED_CLASSES
 
-    for query in queries:
-        cur.execute(query)
-    con.commit()
+
+DEFAULT_DB = "database.db"
+CHUNK_SIZE = 50000  # students generated per task and inserted per transaction
+NAME_POOL_SIZE = 1000  # Faker is only asked for this many first and last names
+ADVANCED_RATIO = 0.25  # share of classes that are Advanced rather than PowerUp
+YEARS = range(2021, 2026)
+MOBILE_PREFIXES = ["91", "92", "93", "96"]
+
+# The dev login, same as it has always been
+DEV_NAME = "Tiago"
+DEV_MAIL = "admin@dev.com"
+DEV_PASSWORD = "123"
+
+# Bulk loading rebuilds the search index once at the end instead of per row
+FTS_TABLES = ["class_fts", "student_fts"]
+
+
+def parse_mix(text):
+    # "Lisbon=2,Sintra=1,Porto=1" -> {"Lisbon": 2.0, ...}; a bare name weighs 1
+    mix = {}
+    for part in filter(None, (part.strip() for part in text.split(","))):
+        location, _, weight = part.partition("=")
+        mix[location.strip()] = float(weight or 1)
+    return mix
 
 
-#  Populate all tables (teacher, class, students) of the db
-def populate_db():
+def slug(text):
+    decomposed = unicodedata.normalize("NFKD", text).lower()
+    return "".join(char for char in decomposed if char.isalnum() and char.isascii())
+
+
+def name_pools(seed):
+    # Faker is slow per call, so it only fills the pools; students combine them
+    from faker import Faker
+
     fake = Faker("pt_PT")
+    fake.seed_instance(seed)
+    first = sorted({fake.first_name() for _ in range(NAME_POOL_SIZE)})
+    last = sorted({fake.last_name() for _ in range(NAME_POOL_SIZE)})
+    return [(name, slug(name)) for name in first], [(name, slug(name)) for name in last]
 
-    #  Populate teacher table
-    DEV_NAME = "Tiago"
-    DEV_MAIL = "admin@dev.com"
-    DEV_PW = ph.hash("123")
-    DEV_CLASS = 1
-    cur.execute(
-        "INSERT INTO teacher (name, email, password, class_id) VALUES (?, ?, ?, ?)",
-        (DEV_NAME, DEV_MAIL, DEV_PW, DEV_CLASS),
-    )
 
-    #  Populate class table
-    classes = [
-        {
-            "course": "Junior Fullstack Developer",
-            "class_type": "PowerUp",
-            "time_slot": "Morning",
-            "location": "Lisbon",
-            "year": 2024,
-            "archived": 0,
-        },
-        {
-            "course": "Junior Fullstack Developer",
-            "class_type": "PowerUp",
-            "time_slot": "Afternoon",
-            "location": "Lisbon",
-            "year": 2024,
-            "archived": 0,
-        },
-        {
-            "course": "Junior Fullstack Developer",
-            "class_type": "PowerUp",
-            "time_slot": "Afternoon",
-            "location": "Sintra",
-            "year": 2024,
-            "archived": 1,
-        },
+def generate_classes(rng, count, mix, archived_ratio):
+    locations, weights = list(mix), list(mix.values())
+    return [
+        (
+            class_id,
+            rng.choice(COURSES),
+            "Advanced" if rng.random() < ADVANCED_RATIO else "PowerUp",
+            rng.choice(TIME_SLOTS),
+            rng.choices(locations, weights)[0],
+            rng.choice(YEARS),
+            int(rng.random() < archived_ratio),
+        )
+        for class_id in range(1, count + 1)
     ]
-    for group in classes:
-        values = tuple(group.values())
-        cur.execute(
-            "INSERT INTO class (course, class_type, time_slot, location, year, archived) VALUES (?, ?, ?, ? , ?, ?)",
-            values,
+
+
+def generate_chunk(task):
+    # Runs in a worker process: students [start, end) and their enrollments.
+    # Seeded per chunk, so the output doesn't depend on how many workers ran.
+    seed, start, end, classes, first_names, last_names, overlap = task
+    rng = random.Random(f"{seed}:{start}")
+    students, enrollments = [], []
+
+    # random() indexing instead of choice()/randrange(): this loop runs once per student
+    random_float = rng.random
+    first_count, last_count, class_count = len(first_names), len(last_names), len(classes)
+
+    for student_id in range(start, end):
+        first, first_slug = first_names[int(random_float() * first_count)]
+        last, last_slug = last_names[int(random_float() * last_count)]
+        home = classes[int(random_float() * class_count)]
+        # Already in the format validate_phone_num produces for PT mobiles
+        digits = f"{MOBILE_PREFIXES[int(random_float() * 4)]}{int(random_float() * 10**7):07}"
+
+        students.append(
+            (
+                student_id,
+                f"{first} {last}",
+                f"{first_slug}.{last_slug}.{student_id}@example.pt",
+                f"{digits[:3]} {digits[3:6]} {digits[6:]}",
+                home[4],
+                home[1],
+                home[2],
+            )
         )
+        enrollments.append((home[0], student_id))
+
+        if class_count > 1 and random_float() < overlap:
+            other = classes[int(random_float() * (class_count - 1))]
+            if other[0] == home[0]:
+                other = classes[-1]  # Skip over the home class
+            enrollments.append((other[0], student_id))
+
+    return students, enrollments
+
+
+def chunks(seed, students, classes, pools, overlap):
+    for start in range(1, students + 1, CHUNK_SIZE):
+        end = min(start + CHUNK_SIZE, students + 1)
+        yield (seed, start, end, classes, *pools, overlap)
+
+
+def without_sync_triggers(con, load):
+    # Drop the FTS sync and counter triggers for the load, then rebuild the indexes
+    # and counters in one pass each
+    triggers = con.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND (name LIKE '%_fts_%' OR name LIKE '%_count_%');"
+    ).fetchall()
+    for name, _ in triggers:
+        con.execute(f"DROP TRIGGER {name};")
+    try:
+        load()
+    finally:
+        for _, sql in triggers:
+            con.execute(sql)
+        for table in FTS_TABLES:
+            con.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild');")
+        for statement in RECOUNT:
+            con.execute(statement)
+        con.commit()
+
+
+def generate(db_path, students=72, classes=3, mix=None, archived_ratio=0.33, overlap=0.0, seed=1, workers=1):
+    rng = random.Random(seed)
+    con = sqlite3.connect(db_path)
+    migrate(con)
+
+    if con.execute("SELECT EXISTS (SELECT 1 FROM student UNION ALL SELECT 1 FROM class);").fetchone()[0]:
+        con.close()
+        raise ValueError(f"{db_path} already has data - use --replace to start over")
+    # An archive tier left from a deleted database would hang its rosters on the new class ids
+    remove_archive(db_path)
+
+    # Nothing to protect yet, so skip the rollback journal and fsyncs while loading
+    con.execute("PRAGMA journal_mode = MEMORY;")
+    con.execute("PRAGMA synchronous = OFF;")
+    con.execute("PRAGMA cache_size = -262144;")  # 256MB, keeps the email index in memory
+
+    class_rows = generate_classes(rng, classes, mix or dict.fromkeys(LOCATIONS, 1), archived_ratio)
+    pools = name_pools(seed)
+    tasks = chunks(seed, students, class_rows, pools, overlap)
+
+    def load():
+        con.executemany(
+            "INSERT INTO class (class_id, course, class_type, time_slot, location, year, archived) VALUES (?, ?, ?, ?, ?, ?, ?);",
+            class_rows,
+        )
+        con.commit()
+
+        if workers > 1:
+            executor = ProcessPoolExecutor(workers)
+            results = executor.map(generate_chunk, tasks)
+        else:
+            executor, results = None, map(generate_chunk, tasks)
+
+        try:
+            for student_rows, enrollment_rows in results:
+                con.executemany(
+                    "INSERT INTO student (student_id, name, email, phone, location, course, class_type) VALUES (?, ?, ?, ?, ?, ?, ?);",
+                    student_rows,
+                )
+                con.executemany(
+                    "INSERT INTO class_student (class_id, student_id) VALUES (?, ?);",
+                    enrollment_rows,
+                )
+                con.commit()
+        finally:
+            if executor:
+                executor.shutdown()
+
+    without_sync_triggers(con, load)
+
+    from auth import hasher
+
+    con.execute(
+        "INSERT OR IGNORE INTO teacher (name, email, password, class_id) VALUES (?, ?, ?, ?);",
+        (DEV_NAME, DEV_MAIL, hasher().hash(DEV_PASSWORD), 1),
+    )
+    bump_version(con.cursor(), ACTIVE_CLASSES, ARCHIVED_CLASSES)
     con.commit()
 
-    # Create a list with 24 ones and 24 twos adn 24 threes
-    class_ids = [1] * 24 + [2] * 24 + [3] * 24
-    # Shuffle the list to randomize the order
-    random.shuffle(class_ids)
-
-    for class_id in class_ids:
-        student = {
-            "name": fake.name(),
-            "email": fake.email(),
-            "phone": validate_phone_num(fake.phone_number()),
-            "location": "Lisbon",
-            "course": "Junior Fullstack Developer",
-            "class_type": "PowerUp",
-        }
-
-        if student["phone"]:
-            values = tuple(student.values())
-            cur.execute(
-                "INSERT INTO student (name, email, phone, location, course, class_type) VALUES (?, ?, ?, ? , ?, ?)",
-                values,
-            )
+    con.execute("PRAGMA journal_mode = WAL;")
+    con.execute("PRAGMA analysis_limit = 1000;")  # Sampled stats are plenty for the planner
+    con.execute("ANALYZE;")
+    con.close()
+
 
-            student_id = cur.lastrowid
+def snapshot_archive(snapshot_path):
+    # snapshot.db -> snapshot-archive.db: the archive tier goes next to it
+    root, ext = os.path.splitext(snapshot_path)
+    return f"{root}-archive{ext or '.db'}"
 
-            # Insert into class_student junction table
-            cur.execute(
-                "INSERT INTO class_student (class_id, student_id) VALUES (?, ?)",
-                (class_id, student_id),
+
+def write_snapshot(db_path, snapshot_path):
+    # A compact copy (the main file and the archive tier's) that --from-snapshot can restore in seconds
+    for source, target in ((db_path, snapshot_path), (archive_path(db_path), snapshot_archive(snapshot_path))):
+        if os.path.exists(target):
+            os.remove(target)
+        if os.path.exists(source):
+            con = sqlite3.connect(source)
+            con.execute("VACUUM INTO ?;", (target,))
+            con.close()
+
+
+def restore_snapshot(snapshot_path, db_path):
+    # The archive tier's rosters point at this database's class ids, so it is replaced too -
+    # or removed, for a snapshot taken before anything was archived
+    remove_archive(db_path)
+    for source_path, target_path in ((snapshot_path, db_path), (snapshot_archive(snapshot_path), archive_path(db_path))):
+        if os.path.exists(source_path):
+            source, target = sqlite3.connect(source_path), sqlite3.connect(target_path)
+            source.backup(target)
+            source.close()
+            target.close()
+    target = sqlite3.connect(db_path)
+    target.execute("PRAGMA journal_mode = WAL;")
+    target.close()
+
+
+def remove_archive(db_path):
+    path = archive_path(db_path)
+    for path in (path, f"{path}-journal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def remove_db(db_path):
+    for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+    remove_archive(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the database and fill it with synthetic classes and students.")
+    parser.add_argument("--db", default=os.getenv("DATABASE", DEFAULT_DB))
+    parser.add_argument("--students", type=int, default=72)
+    parser.add_argument("--classes", type=int, default=3)
+    parser.add_argument("--locations", type=parse_mix, default=None, help='weighted mix, e.g. "Lisbon=2,Sintra=1,Porto=1"')
+    parser.add_argument("--archived-ratio", type=float, default=0.33)
+    parser.add_argument("--overlap", type=float, default=0.0, help="share of students also enrolled in a second class")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="processes generating rows")
+    parser.add_argument("--replace", action="store_true", help="delete the database (and its archive tier) first")
+    parser.add_argument("--snapshot", help="also write a compact copy of the result here")
+    parser.add_argument("--from-snapshot", help="restore this snapshot instead of generating")
+    args = parser.parse_args()
+
+    if args.replace:
+        remove_db(args.db)
+
+    start = time.perf_counter()
+    if args.from_snapshot:
+        restore_snapshot(args.from_snapshot, args.db)
+        con = sqlite3.connect(args.db)
+        migrate(con)  # A snapshot from an older build catches up on migrations
+        con.close()
+    else:
+        try:
+            generate(
+                args.db,
+                students=args.students,
+                classes=args.classes,
+                mix=args.locations,
+                archived_ratio=args.archived_ratio,
+                overlap=args.overlap,
+                seed=args.seed,
+                workers=args.workers,
             )
+        except ValueError as e:
+            parser.exit(1, f"{e}\n")
 
-    con.commit()
+    if args.snapshot:
+        write_snapshot(args.db, args.snapshot)
+    print(f"{args.db} ready in {time.perf_counter() - start:.1f}s")
 
 
-initialize_db()
-con.close()
+if __name__ == "__main__":
+    main()
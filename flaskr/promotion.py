@@ -0,0 +1,143 @@
+from versions import bump_version, class_version, ACTIVE_CLASSES, ARCHIVED_CLASSES
+
+
+TARGET_TYPE = "Advanced"
+TARGET_TIME_SLOT = "All Day"
+
+
+def parse_selection(values, default_class_id):
+    # Checkbox values are "student_id" (for the form's class) or "class_id:student_id"
+    selections = {}
+    for value in values:
+        class_id, _, student_id = value.rpartition(":")
+        class_id = int(class_id or default_class_id)
+        selections.setdefault(class_id, set()).add(int(student_id))
+    return selections
+
+
+def promote(con, selections, dry_run=False):
+    # Advance {source_class_id: {student_ids}} into their cohort's Advanced class,
+    # all in one transaction. Returns a preview of every target roster, and the
+    # sources that were skipped because there is no level above them.
+    cur = con.cursor()
+    marks = ", ".join("?" for _ in selections)
+
+    try:
+        sources = cur.execute(
+            f"SELECT class_id, class_type, course, location, year FROM class WHERE class_id IN ({marks});",
+            sorted(selections),
+        ).fetchall()
+        if len(sources) != len(selections):
+            raise LookupError("Class not found")
+
+        # An Advanced class would be "promoted" into itself, then archived
+        skipped = sorted(row["class_id"] for row in sources if row["class_type"] == TARGET_TYPE)
+        selections = {class_id: ids for class_id, ids in selections.items() if class_id not in skipped}
+        source_ids = sorted(selections)
+        marks = ", ".join("?" for _ in source_ids)
+        if not source_ids:
+            con.rollback()
+            return {"promoted": 0, "targets": [], "sources": [], "skipped": skipped}
+
+        cohorts = {
+            row["class_id"]: (row["course"], row["location"], row["year"])
+            for row in sources
+            if row["class_id"] in selections
+        }
+        targets = find_or_create_targets(cur, set(cohorts.values()))
+
+        # Copy enrollments straight from the source class, so ids that aren't
+        # actually in that class are ignored
+        moves = [
+            (targets[cohorts[class_id]]["class_id"], class_id, student_id)
+            for class_id, student_ids in selections.items()
+            for student_id in sorted(student_ids)
+        ]
+        cur.executemany(
+            """INSERT OR IGNORE INTO class_student (class_id, student_id)
+            SELECT ?, student_id FROM class_student WHERE class_id = ? AND student_id = ?;""",
+            moves,
+        )
+        promoted = cur.rowcount
+        # Recorded against the source class; a trigger keeps its promoted_count
+        cur.executemany(
+            """INSERT OR IGNORE INTO promotion (target_id, class_id, student_id)
+            SELECT ?, class_id, student_id FROM class_student WHERE class_id = ? AND student_id = ?;""",
+            moves,
+        )
+
+        # The source classes are finished once their students move on
+        cur.execute(f"UPDATE class SET archived = 1 WHERE class_id IN ({marks});", source_ids)
+
+        preview = [roster_preview(cur, target, selections, cohorts) for target in targets.values()]
+    except Exception:
+        con.rollback()
+        raise
+
+    if dry_run:
+        con.rollback()
+    else:
+        bump_version(
+            cur,
+            ACTIVE_CLASSES,
+            ARCHIVED_CLASSES,
+            *(class_version(class_id) for class_id in source_ids),
+            *(class_version(target["class_id"]) for target in targets.values()),
+        )
+        con.commit()
+
+    return {"promoted": promoted, "targets": preview, "sources": source_ids, "skipped": skipped}
+
+
+def find_or_create_targets(cur, cohorts):
+    # One lookup for every cohort, then one insert per cohort that has no Advanced class yet.
+    # Not an ON CONFLICT upsert: add_class may legitimately create several Advanced classes
+    # per cohort, so there is no unique key to conflict on - we reuse the oldest one.
+    cohorts = sorted(cohorts)
+    values = ", ".join("(?, ?, ?)" for _ in cohorts)
+    rows = cur.execute(
+        f"""SELECT MIN(class_id) AS class_id, course, location, year FROM class
+        WHERE class_type = ? AND (course, location, year) IN (VALUES {values})
+        GROUP BY course, location, year;""",
+        [TARGET_TYPE, *(field for cohort in cohorts for field in cohort)],
+    ).fetchall()
+    targets = {
+        (row["course"], row["location"], row["year"]): {"class_id": row["class_id"], "created": False}
+        for row in rows
+    }
+
+    for cohort in cohorts:
+        if cohort in targets:
+            continue
+        course, location, year = cohort
+        class_id = cur.execute(
+            """INSERT INTO class (course, class_type, time_slot, location, year, archived)
+            VALUES (?, ?, ?, ?, ?, 0) RETURNING class_id;""",
+            (course, TARGET_TYPE, TARGET_TIME_SLOT, location, year),
+        ).fetchone()[0]
+        targets[cohort] = {"class_id": class_id, "created": True}
+
+    for (course, location, year), target in targets.items():
+        target.update(course=course, location=location, year=year)
+    return targets
+
+
+def roster_preview(cur, target, selections, cohorts):
+    selected = [
+        student_id
+        for class_id, student_ids in selections.items()
+        if cohorts[class_id] == (target["course"], target["location"], target["year"])
+        for student_id in student_ids
+    ]
+    marks = ", ".join("?" for _ in selected)
+    total = cur.execute(
+        "SELECT student_count FROM class WHERE class_id = (?);", (target["class_id"],)
+    ).fetchone()[0]
+    added = cur.execute(
+        f"""SELECT s.student_id, s.name, s.email FROM class_student AS cs
+        JOIN student AS s ON s.student_id = cs.student_id
+        WHERE cs.class_id = ? AND s.student_id IN ({marks}) ORDER BY s.name;""",
+        (target["class_id"], *selected),
+    ).fetchall()
+
+    return {**target, "total_students": total, "students": [dict(row) for row in added]}
@@ -0,0 +1,174 @@
+from pagination import encode_cursor, decode_cursor
+from cache import LRUCache
+from versions import data_version
+import re, unicodedata
+
+
+SEARCH_LIMIT = 20
+# Upper bound on FTS hits considered per source, so a one-letter prefix can't fan out
+MAX_HITS = 500
+SCOPES = {"archived": (1,), "active": (0,), "all": (0, 1)}
+RANK_ORDER = ["rank", "class_id"]
+CLASS_FIELDS = ["class_type", "course", "location", "time_slot", "year"]
+CACHE_SIZE = 512
+
+
+def fold(text):
+    # Same folding as the FTS tokenizer (unicode61 remove_diacritics 2)
+    decomposed = unicodedata.normalize("NFKD", str(text)).lower()
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    return re.findall(r"[^\W_]+", fold(text or ""))
+
+
+def fts_query(words):
+    # Every word becomes a quoted prefix term, so user input is never parsed as FTS syntax
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def matches(words, tokens):
+    # What MATCH does with our queries: every word prefixes some token of the row
+    return all(any(token.startswith(word) for token in tokens) for word in words)
+
+
+def student_matches(cur, match, tier=""):
+    # Students matching the query, with the classes they are enrolled in
+    hits = cur.execute(
+        f"""SELECT rowid, bm25(student_fts), name, email, phone FROM {tier}student_fts
+        WHERE student_fts MATCH ? ORDER BY rank LIMIT ?;""",
+        (match, MAX_HITS + 1),
+    ).fetchall()
+
+    students = {row[0]: row for row in hits[:MAX_HITS]}
+    enrollments = []
+    if students:
+        marks = ", ".join("?" for _ in students)
+        enrollments = cur.execute(
+            f"SELECT class_id, student_id FROM {tier}class_student WHERE student_id IN ({marks});",
+            list(students),
+        ).fetchall()
+    return students, enrollments, len(hits) <= MAX_HITS
+
+
+def find_matches(cur, words, scope):
+    # A class matches on its own fields (or its id) or through any enrolled student.
+    # bm25() is lower-is-better, so each class keeps its best score.
+    match = fts_query(words)
+    class_hits = cur.execute(
+        "SELECT rowid, bm25(class_fts) FROM class_fts WHERE class_fts MATCH ? ORDER BY rank LIMIT ?;",
+        (match, MAX_HITS + 1),
+    ).fetchall()
+    # Rosters of archived classes may have moved to the archive tier
+    tiers = [""] if scope == "active" else ["", "archive."]
+    student_sets = [student_matches(cur, match, tier) for tier in tiers]
+    # Only a result set that wasn't cut short can be filtered for longer queries
+    complete = len(class_hits) <= MAX_HITS and all(whole for _, _, whole in student_sets)
+
+    scores, docs = {}, {}
+    for class_id, score in class_hits[:MAX_HITS]:
+        scores[class_id] = score
+
+    for students, enrollments, _ in student_sets:
+        for class_id, student_id in enrollments:
+            _, score, *fields = students[student_id]
+            scores[class_id] = min(scores.get(class_id, score), score)
+            docs.setdefault(class_id, []).append(tokenize(" ".join(filter(None, fields))))
+
+    if len(words) == 1 and words[0].isdigit():
+        scores[int(words[0])] = -1e9
+
+    if not scores:
+        return {"results": [], "docs": [], "complete": complete}
+
+    archived = SCOPES.get(scope, SCOPES["archived"])
+    rows = cur.execute(
+        f"""SELECT class_id, course, class_type, time_slot, location, year, archived, student_count, promoted_count
+        FROM class
+        WHERE class_id IN ({", ".join("?" for _ in scores)})
+        AND archived IN ({", ".join("?" for _ in archived)});""",
+        (*scores, *archived),
+    ).fetchall()
+
+    results = sorted(
+        ({**dict(row), "rank": scores[row["class_id"]]} for row in rows),
+        key=lambda result: (result["rank"], result["class_id"]),
+    )
+    # The rows each result matched through - its own fields plus any matching students
+    result_docs = [
+        [tokenize(" ".join(str(result[field] or "") for field in CLASS_FIELDS))]
+        + docs.get(result["class_id"], [])
+        for result in results
+    ]
+    return {"results": results, "docs": result_docs, "complete": complete}
+
+
+class SearchCache:
+    # Search results per (data version, scope, normalized query). The version is in
+    # the key, so a result computed before a write can never be served after it;
+    # older versions are also dropped as soon as a newer one is seen.
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.entries = LRUCache(maxsize)
+        self.version = None
+
+    def lookup(self, cur, words, scope):
+        version = data_version(cur)
+        if self.version is None or version > self.version:
+            self.entries.clear()
+            self.version = version
+
+        key = (version, scope, " ".join(words))
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.from_prefix(version, words, scope) or find_matches(cur, words, scope)
+            self.entries.set(key, entry)
+        return entry
+
+    def from_prefix(self, version, words, scope):
+        # "lisb" can only match rows that "lis" matched, so a complete result
+        # for a shorter query is filtered instead of asking SQLite again.
+        # Results keep the shorter query's ranking.
+        text = " ".join(words)
+        if text.isdigit():
+            return None  # An exact class id match can't be derived from a prefix
+
+        for end in range(len(text) - 1, 0, -1):
+            entry = self.entries.get((version, scope, text[:end].rstrip()))
+            if not entry or not entry["complete"]:
+                continue
+
+            kept = [
+                (result, docs)
+                for result, docs in zip(entry["results"], entry["docs"])
+                if any(matches(words, doc) for doc in docs)
+            ]
+            return {
+                "results": [result for result, _ in kept],
+                "docs": [docs for _, docs in kept],
+                "complete": True,
+            }
+        return None
+
+
+cache = SearchCache()
+
+
+def search_classes(cur, q, scope="archived", limit=SEARCH_LIMIT, after=None):
+    words = tokenize(q)
+    if not words:
+        return [], None
+
+    results = cache.lookup(cur, words, scope)["results"]
+
+    after_key = decode_cursor(after, RANK_ORDER)
+    # Compared in Python, not by SQLite, so a cursor not made of numbers is ignored
+    if after_key and all(isinstance(value, (int, float)) for value in after_key):
+        results = [
+            result
+            for result in results
+            if (result["rank"], result["class_id"]) > tuple(after_key)
+        ]
+
+    next_cursor = encode_cursor(results[limit - 1], RANK_ORDER) if len(results) > limit else None
+    return results[:limit], next_cursor
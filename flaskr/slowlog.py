@@ -0,0 +1,123 @@
+from collections import Counter
+from logging.handlers import RotatingFileHandler
+import argparse, json, logging, os, re, sqlite3, time
+
+
+# Opt-in: nothing is timed against a threshold or written unless SLOW_QUERY_MS is set
+SLOW_QUERY_MS = os.getenv("SLOW_QUERY_MS")
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG", "slow-queries.log")
+LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+threshold = float(SLOW_QUERY_MS) / 1000 if SLOW_QUERY_MS else None
+logger = logging.getLogger("flaskr.slow_queries")
+logger.propagate = False
+
+
+def enable(path=SLOW_QUERY_LOG):
+    if not logger.handlers:
+        handler = RotatingFileHandler(path, maxBytes=LOG_BYTES, backupCount=LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+if threshold is not None:
+    enable()
+
+
+def parameter_shape(parameters):
+    # Types and count only - the values may be personal data
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return {"count": len(parameters), "types": dict(Counter(type(value).__name__ for value in parameters))}
+    return {"count": None}  # executemany over a generator - not consumed here
+
+
+def normalize(sql):
+    # One entry per query shape: IN lists and multi-row VALUES of any length look the same
+    sql = " ".join(sql.split())
+    sql = re.sub(r"\?(\s*,\s*\?)+", "?+", sql)
+    return re.sub(r"\(\?\+?\)(\s*,\s*\(\?\+?\))+", "(?+)+", sql)
+
+
+def query_plan(con, sql, parameters):
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        # A plain cursor, so the EXPLAIN itself isn't timed or logged
+        rows = sqlite3.Cursor(con).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    except (sqlite3.Error, ValueError) as e:
+        return [f"(no plan: {e})"]
+    return [row[3] for row in rows]
+
+
+def record(con, sql, parameters, seconds, many=False):
+    if many:
+        # Explain with the first parameter set, if it can be read without consuming anything
+        parameters = parameters[0] if isinstance(parameters, (list, tuple)) and parameters else None
+    logger.info(
+        json.dumps(
+            {
+                "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "ms": round(seconds * 1000, 3),
+                "sql": " ".join(sql.split()),
+                "params": parameter_shape(parameters),
+                "many": many,
+                "plan": query_plan(con, sql, parameters) if parameters is not None else None,
+            }
+        )
+    )
+
+
+def read_entries(path):
+    # The live file plus its rotated backups, oldest first
+    paths = [f"{path}.{i}" for i in range(LOG_BACKUPS, 0, -1)] + [path]
+    for name in paths:
+        if not os.path.exists(name):
+            continue
+        with open(name) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(entries, top=10):
+    offenders = {}
+    for entry in entries:
+        key = normalize(entry["sql"])
+        stats = offenders.setdefault(key, {"sql": key, "count": 0, "total_ms": 0, "max_ms": 0, "plan": None})
+        stats["count"] += 1
+        stats["total_ms"] += entry["ms"]
+        if entry["ms"] >= stats["max_ms"]:
+            stats["max_ms"], stats["plan"] = entry["ms"], entry.get("plan")
+    return sorted(offenders.values(), key=lambda stats: stats["total_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the slow-query log, worst total time first.")
+    parser.add_argument("--log", default=SLOW_QUERY_LOG)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    offenders = summarize(read_entries(args.log), args.top)
+    if not offenders:
+        print(f"No slow queries in {args.log}")
+        return
+
+    for rank, stats in enumerate(offenders, start=1):
+        print(
+            f"{rank}. {stats['total_ms']:.1f}ms total, {stats['count']} calls, "
+            f"{stats['total_ms'] / stats['count']:.1f}ms avg, {stats['max_ms']:.1f}ms max"
+        )
+        print(f"   {stats['sql']}")
+        for step in stats["plan"] or []:
+            print(f"     {step}")
+
+
+if __name__ == "__main__":
+    main()
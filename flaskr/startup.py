@@ -0,0 +1,117 @@
+import argparse, os, re, stat, subprocess, sys, time
+
+# app.py imports this module before anything else, so cold-start timing starts here
+STARTED = time.perf_counter()
+
+# Opt-in: compiled templates survive restarts. Jinja loads whatever bytecode it finds
+# there, so the directory must be private - by default Jinja's own per-user one.
+JINJA_BYTECODE_CACHE = os.getenv("JINJA_BYTECODE_CACHE", "False") == "True"
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", "")
+# Startup-optimized mode: pay for templates, phone metadata and argon2 before the first request
+WARM_UP = os.getenv("WARM_UP", "False") == "True"
+
+
+def find_env_file(start):
+    # Where load_dotenv() would look: the app's directory, then each parent
+    path = os.path.abspath(start)
+    while True:
+        candidate = os.path.join(path, ".env")
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def load_env(start):
+    # python-dotenv is only imported when there is a .env file to read
+    path = find_env_file(start)
+    if path:
+        from dotenv import load_dotenv
+
+        load_dotenv(path)
+
+
+def private_dir(path):
+    # Ours alone or not at all: not a symlink, owned by us, writable by nobody else
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if (
+        stat.S_ISLNK(info.st_mode)
+        or not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+    ):
+        raise RuntimeError(f"JINJA_CACHE_DIR {path} must be a directory owned by this user and writable only by it")
+    return path
+
+
+def configure(app):
+    # Must run before anything touches app.jinja_env
+    if JINJA_BYTECODE_CACHE:
+        from jinja2 import FileSystemBytecodeCache
+
+        # Without a directory Jinja makes (and checks) a 0700 one per user in the temp dir
+        cache = FileSystemBytecodeCache(private_dir(JINJA_CACHE_DIR)) if JINJA_CACHE_DIR else FileSystemBytecodeCache()
+        app.jinja_options = {**app.jinja_options, "bytecode_cache": cache}
+
+
+def warm_up(app):
+    # Everything the first requests would otherwise load lazily. Returns seconds per step.
+    from utils import load_phone_metadata
+    from auth import hasher
+
+    timings = {}
+    start = time.perf_counter()
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+    timings["templates"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_phone_metadata()
+    timings["phone_metadata"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hasher()
+    timings["argon2"] = time.perf_counter() - start
+    return timings
+
+
+def import_report(top=15):
+    # A fresh interpreter, so nothing is already imported
+    flaskr = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=flaskr,
+        capture_output=True,
+        text=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if match:
+            _, cumulative_us, _, name = match.groups()
+            modules.append((name, int(cumulative_us)))
+
+    total = next((cumulative for name, cumulative in modules if name == "app"), 0)
+    print(f"import app: {total / 1000:.1f}ms")
+    for name, cumulative in sorted(modules, key=lambda module: module[1], reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold-start cost: import time and warm-up time.")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    import_report(args.top)
+
+    from app import app
+
+    for step, seconds in warm_up(app).items():
+        print(f"warm-up {step}: {seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,16 +19,40 @@ function handleAction(action) {
   }
 }
 
+const SEARCH_DEBOUNCE_MS = 200;
+
 function search() {
   const input = document.querySelector('.search-input');
   const tbody = document.querySelector('tbody');
   const templateRow = document.querySelector('#template-row');
+  if (!input) return;
+
+  let timer = null;
+  let controller = null;
+
+  // Wait for a pause in typing, and cancel the previous request so only the
+  // latest query is ever rendered
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    timer = setTimeout(runSearch, SEARCH_DEBOUNCE_MS);
+  });
+
+  async function runSearch() {
+    if (controller) controller.abort();
+    controller = new AbortController();
 
-  input.addEventListener('input', async function () {
-    const response = await fetch('/search?q=' + input.value);
+    let response, archivedClasses;
+    try {
+      response = await fetch('/search?q=' + encodeURIComponent(input.value), {
+        signal: controller.signal,
+      });
+      if (response.ok) archivedClasses = (await response.json()).results;
+    } catch (error) {
+      if (error.name === 'AbortError') return;
+      throw error;
+    }
 
     if (response.ok) {
-      const archivedClasses = await response.json();
       tbody.innerHTML = '';
 
       // Clone the template row and populate it with data
@@ -48,6 +72,12 @@ function search() {
 
         tableRow.querySelector('.year').textContent = archivedClass.year;
 
+        tableRow.querySelector('.student-count').textContent =
+          archivedClass.student_count;
+
+        tableRow.querySelector('.promoted-count').textContent =
+          archivedClass.promoted_count;
+
         // Update form actions dynamically
         const selectForm = tableRow.querySelector('.select-form');
         selectForm.action = `/actions/select_archived_class`;
@@ -64,7 +94,33 @@ function search() {
     } else {
       console.error('Search request failed:', response.statusText);
     }
-  });
+  }
 }
 
 search(); // Initialize search functionality
+
+// Poll a background import and show its progress until it finishes
+function pollJob() {
+  const status = document.querySelector('.job-status');
+  if (!status) return;
+
+  const timer = setInterval(async function () {
+    const response = await fetch(status.dataset.jobUrl);
+    if (!response.ok) {
+      clearInterval(timer);
+      return;
+    }
+
+    const job = await response.json();
+    status.textContent =
+      `${job.status}: ${job.processed} rows processed, ` +
+      `${job.rejected} rejected (${job.rows_per_sec} rows/s)`;
+
+    if (job.status === 'done' || job.status === 'failed') {
+      clearInterval(timer);
+      if (job.error) status.textContent += ` - ${job.error}`;
+    }
+  }, 1000);
+}
+
+pollJob();
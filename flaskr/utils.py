@@ -1,5 +1,5 @@
-import phonenumbers, re
-from phonenumbers import NumberParseException
+from functools import lru_cache
+import re, os
 
 # Constants
 LOCATIONS = ["Lisbon", "Sintra", "Porto"]
@@ -7,16 +7,35 @@ CLASS_TYPES = ["PowerUp", "Advanced"]
 COURSES = ["Junior Fullstack Developer"]
 TIME_SLOTS = ["Morning", "Afternoon", "All Day"]
 
+PHONE_REGION = os.getenv("PHONE_REGION", "PT")
+PHONE_CACHE_SIZE = 8192
+
+LETTERS = re.compile("[a-zA-Z]")
+SEPARATORS = re.compile(r"[\s().-]")
+
+# Numbers we can format without libphonenumber, per region.
+# PT mobiles (91x/92x/93x/96x) are most of our data; anything else falls through.
+FAST_PATHS = {
+    "PT": re.compile(r"^(?:\+351|00351)?(9[1236]\d)(\d{3})(\d{3})$"),
+}
+
 
 # Validate the phone number and standardize the format
-def validate_phone_num(contact_info):
-    REGION = "PT"
+def validate_phone_num(contact_info, region=None):
+    return cached_validate(contact_info, region or PHONE_REGION)
+
 
-    if re.search("[a-zA-Z]", contact_info):
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def cached_validate(contact_info, region):
+    if re.search(LETTERS, contact_info):
         return False
 
+    # Imported on first use: the fast paths below cover most numbers without it
+    import phonenumbers
+    from phonenumbers import NumberParseException
+
     try:
-        phone_number = phonenumbers.parse(contact_info, REGION)
+        phone_number = phonenumbers.parse(contact_info, region)
 
         if not phonenumbers.is_possible_number(phone_number):
             return None
@@ -31,3 +50,42 @@ def validate_phone_num(contact_info):
         return formatted_number
     except NumberParseException:
         return None
+
+
+def load_phone_metadata(region=None):
+    # libphonenumber loads region metadata on demand; warm up only the one we use
+    from phonenumbers.phonemetadata import PhoneMetadata
+
+    return PhoneMetadata.metadata_for_region(region or PHONE_REGION)
+
+
+# Validate a whole list at once, same results as calling validate_phone_num on each
+def validate_phone_nums(numbers, region=None):
+    region = region or PHONE_REGION
+    fast_path = FAST_PATHS.get(region)
+    results = {}
+
+    for number in set(numbers):
+        if not number:
+            results[number] = None
+            continue
+
+        compact = SEPARATORS.sub("", number)
+        digits = compact.lstrip("+")
+        match = fast_path.match(compact) if fast_path else None
+
+        if match:
+            results[number] = " ".join(match.groups())
+        elif digits.isdigit() and not 4 <= len(digits) <= 17:
+            # Too short or too long for any region, no need to parse it
+            results[number] = None
+        else:
+            results[number] = cached_validate(number, region)
+
+    return [results[number] for number in numbers]
+
+
+# Students are matched on their email (imports, sync, the archive tier), so it is
+# always stored trimmed and lowercased
+def normalize_email(email):
+    return email.strip().lower() if email else email
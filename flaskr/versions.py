@@ -0,0 +1,73 @@
+import time
+
+
+# Counters bumped inside every write transaction that changes what readers see.
+# Caches put the relevant counters in their keys, so a write only invalidates
+# the entries built from data it touched.
+GLOBAL = "global"  # Any write at all (search results)
+ACTIVE_CLASSES = "classes:active"  # Homepage listing
+ARCHIVED_CLASSES = "classes:archived"  # Archived classes listing
+
+
+def class_version(class_id):
+    # A class's own row and its roster
+    return f"class:{class_id}"
+
+
+def bump_version(cur, *names):
+    # changed_at backs the Last-Modified header of whatever the counter covers
+    now = time.time()
+    cur.executemany(
+        """INSERT INTO data_version (name, version, changed_at) VALUES (?, 1, ?)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at;""",
+        [(name, now) for name in dict.fromkeys((GLOBAL, *names))],
+    )
+
+
+def bump_roster(cur, class_id):
+    # A roster change also moves the class's student count on its listing
+    row = cur.execute("SELECT archived FROM class WHERE class_id = (?);", (class_id,)).fetchone()
+    listing = ARCHIVED_CLASSES if row and row[0] else ACTIVE_CLASSES
+    bump_version(cur, listing, class_version(class_id))
+
+
+def bump_student_classes(cur, student_ids):
+    # Every class a student is enrolled in shows their details on its roster
+    student_ids = list(student_ids)
+    if not student_ids:
+        return
+    marks = ", ".join("?" for _ in student_ids)
+    rows = cur.execute(
+        f"SELECT DISTINCT class_id FROM class_student WHERE student_id IN ({marks});",
+        student_ids,
+    ).fetchall()
+    bump_version(cur, *(class_version(row[0]) for row in rows))
+
+
+def data_version(cur, name=GLOBAL):
+    row = cur.execute(
+        "SELECT version FROM data_version WHERE name = (?);", (name,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def data_versions(cur, names):
+    # Current value of several counters, in the order asked for
+    marks = ", ".join("?" for _ in names)
+    rows = dict(
+        cur.execute(
+            f"SELECT name, version FROM data_version WHERE name IN ({marks});", names
+        ).fetchall()
+    )
+    return tuple(rows.get(name, 0) for name in names)
+
+
+def version_state(cur, names):
+    # The counters, as data_versions() gives them, plus when the latest of them moved
+    marks = ", ".join("?" for _ in names)
+    rows = cur.execute(
+        f"SELECT name, version, changed_at FROM data_version WHERE name IN ({marks});", names
+    ).fetchall()
+    versions = {row[0]: row[1] for row in rows}
+    changed_at = max((row[2] for row in rows if row[2] is not None), default=None)
+    return tuple(versions.get(name, 0) for name in names), changed_at
@@ -0,0 +1,82 @@
+import os, sys, tempfile
+import pytest
+
+# The app imports its modules as siblings, the way `python app.py` runs it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flaskr"))
+# app.py migrates DATABASE on import; keep that away from flaskr/database.db
+os.environ.setdefault("DATABASE", os.path.join(tempfile.mkdtemp(), "import.db"))
+
+# Stored the way validate_phone_num formats them
+PHONES = ["912 345 678", "923 456 789", "934 567 890", "965 432 109", "911 111 111", "922 222 222"]
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A fresh, migrated database (and archive tier) per test
+    import app as app_module
+    import db, search
+    from migrations import migrate_db
+
+    path = str(tmp_path / "test.db")
+    migrate_db(path)
+    app_module.app.config.update(DATABASE=path, TESTING=True)
+    # Caches are keyed by data version, which every new database starts again from
+    app_module.page_cache.clear()
+    app_module.class_cache.clear()
+    search.cache.entries.clear()
+    yield app_module.app
+    if path in db.pools:
+        db.pools.pop(path).close_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def con(app):
+    # Like the app's own writers: foreign keys on, the archive tier attached as `archive`
+    from archive import connect_writer
+
+    con = connect_writer(app.config["DATABASE"])
+    yield con
+    con.close()
+
+
+@pytest.fixture
+def make_class(con):
+    # make_class(students=3) -> (class_id, [student_id, ...])
+    def make(class_type="PowerUp", location="Lisbon", year=2024, students=0, prefix="student"):
+        class_id = con.execute(
+            """INSERT INTO class (course, class_type, time_slot, location, year, archived)
+            VALUES ('Junior Fullstack Developer', ?, 'Morning', ?, ?, 0);""",
+            (class_type, location, year),
+        ).lastrowid
+        student_ids = []
+        for i in range(students):
+            student_id = con.execute(
+                """INSERT INTO student (name, email, phone, location, course, class_type)
+                VALUES (?, ?, ?, ?, 'Junior Fullstack Developer', ?);""",
+                (f"{prefix.title()} {i}", f"{prefix}.{class_id}.{i}@example.pt", PHONES[i % len(PHONES)], location, class_type),
+            ).lastrowid
+            con.execute("INSERT INTO class_student (class_id, student_id) VALUES (?, ?);", (class_id, student_id))
+            student_ids.append(student_id)
+        con.commit()
+        return class_id, student_ids
+
+    return make
+
+
+@pytest.fixture
+def counts(con):
+    # counts(class_id) -> (trigger-maintained student_count, enrollments in the tier holding the roster)
+    def count(class_id):
+        row = con.execute("SELECT student_count, in_archive FROM class WHERE class_id = ?;", (class_id,)).fetchone()
+        tier = "archive." if row["in_archive"] else ""
+        actual = con.execute(
+            f"SELECT COUNT(*) FROM {tier}class_student WHERE class_id = ?;", (class_id,)
+        ).fetchone()[0]
+        return row["student_count"], actual
+
+    return count
@@ -0,0 +1,42 @@
+def get(client, url, status=200, **args):
+    response = client.get(url, query_string=args)
+    assert response.status_code == status, response.get_json()
+    return response.get_json()
+
+
+def test_fields_pick_the_columns(client, make_class):
+    class_id, _ = make_class(students=2)
+
+    body = get(client, "/api/v1/students", fields="name,email")
+    assert [set(student) for student in body["data"]] == [{"email", "name"}] * 2
+    assert get(client, f"/api/v1/classes/{class_id}", fields="year, location")["data"] == {"year": 2024, "location": "Lisbon"}
+    roster = get(client, f"/api/v1/classes/{class_id}/students", fields="name")["data"]
+    assert roster == [{"name": "Student 0"}, {"name": "Student 1"}]
+
+
+def test_unknown_fields_and_bad_filters_are_a_400(client, make_class):
+    class_id, _ = make_class()
+
+    body = get(client, "/api/v1/students", 400, fields="name,password")
+    assert "password" in body["error"] and "Choose from" in body["error"]
+    get(client, f"/api/v1/classes/{class_id}", 400, fields="teacher_id")
+    get(client, "/api/v1/classes", 400, archived=2)
+    get(client, "/api/v1/classes", 400, year="last")
+    get(client, "/api/v1/classes/999", 404)
+
+
+def test_classes_filter_and_page(client, make_class):
+    lisbon = [make_class()[0] for _ in range(3)]
+    porto, _ = make_class(location="Porto", year=2023)
+
+    assert [row["class_id"] for row in get(client, "/api/v1/classes", location="Porto")["data"]] == [porto]
+    assert [row["class_id"] for row in get(client, "/api/v1/classes", year=2024)["data"]] == lisbon
+
+    seen, after = [], ""
+    while True:
+        body = get(client, "/api/v1/classes", limit=1, after=after, fields="class_id")
+        seen += [row["class_id"] for row in body["data"]]
+        if not (after := body["next_cursor"]):
+            break
+    # Ordered by location, then id
+    assert seen == [*lisbon, porto]
@@ -0,0 +1,130 @@
+import csv, io
+
+
+def archive(client, class_id):
+    assert client.post("/actions/archive", data={"class_id": str(class_id)}).status_code == 200
+
+
+def unarchive(client, class_id):
+    assert client.post("/actions/unarchive", data={"class_id": str(class_id)}).status_code == 200
+
+
+def class_totals(con):
+    # The trigger-maintained listing totals against a real COUNT
+    kept = con.execute("SELECT archived, location, classes FROM class_count WHERE classes > 0 ORDER BY 1, 2;")
+    real = con.execute("SELECT archived, location, COUNT(*) FROM class GROUP BY 1, 2 ORDER BY 1, 2;")
+    return [tuple(row) for row in kept], [tuple(row) for row in real]
+
+
+def enrolled(con, class_id, tier=""):
+    return sorted(
+        row[0] for row in con.execute(f"SELECT student_id FROM {tier}class_student WHERE class_id = ?;", (class_id,))
+    )
+
+
+def test_archive_round_trip_keeps_counters_and_ids(client, con, make_class, counts):
+    class_id, student_ids = make_class(students=4)
+    other, _ = make_class(location="Porto", students=1, prefix="other")
+    # One student is also enrolled elsewhere, so they stay in the hot tables
+    con.execute("INSERT INTO class_student (class_id, student_id) VALUES (?, ?);", (other, student_ids[0]))
+    con.commit()
+
+    archive(client, class_id)
+    assert con.execute("SELECT in_archive FROM class WHERE class_id = ?;", (class_id,)).fetchone()[0] == 1
+    assert enrolled(con, class_id) == []
+    assert enrolled(con, class_id, "archive.") == student_ids
+    assert counts(class_id) == (4, 4)
+    assert counts(other) == (2, 2)
+    kept, real = class_totals(con)
+    assert kept == real
+
+    unarchive(client, class_id)
+    assert enrolled(con, class_id) == student_ids
+    assert counts(class_id) == (4, 4)
+    assert con.execute("SELECT COUNT(*) FROM student;").fetchone()[0] == 5
+    assert con.execute("SELECT COUNT(*) FROM archive.student;").fetchone()[0] == 0
+    kept, real = class_totals(con)
+    assert kept == real
+
+
+def test_archived_students_stay_listed(client, make_class):
+    class_id, student_ids = make_class(students=3)
+    archive(client, class_id)
+
+    listed = [(student["student_id"], student["tier"]) for student in client.get("/api/v1/students").get_json()["data"]]
+    assert listed == [(i, "archive") for i in student_ids]
+    detail = client.get(f"/api/v1/students/archive/{student_ids[1]}")
+    assert detail.status_code == 200 and detail.get_json()["data"]["name"] == "Student 1"
+    assert client.get(f"/api/v1/students/{student_ids[1]}").status_code == 404
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/export/students").get_data(as_text=True))))
+    assert [(int(row["student_id"]), row["tier"]) for row in rows] == [(i, "archive") for i in student_ids]
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/export/archived_classes").get_data(as_text=True))))
+    assert {row["student_key"] for row in rows} == {f"student.{class_id}.{i}@example.pt" for i in range(3)}
+
+
+def test_unarchive_gives_a_taken_id_a_new_one(client, con, make_class):
+    class_id, student_ids = make_class(students=2)
+    archive(client, class_id)
+    # A new student took the first archived student's old id in the meantime
+    con.execute(
+        "INSERT INTO student (student_id, name, email) VALUES (?, 'Newcomer', 'newcomer@example.pt');",
+        (student_ids[0],),
+    )
+    con.commit()
+
+    unarchive(client, class_id)
+    restored = dict(
+        con.execute(
+            """SELECT s.email, s.student_id FROM class_student AS cs
+            JOIN student AS s ON s.student_id = cs.student_id WHERE cs.class_id = ?;""",
+            (class_id,),
+        ).fetchall()
+    )
+    assert restored[f"student.{class_id}.1@example.pt"] == student_ids[1]
+    assert restored[f"student.{class_id}.0@example.pt"] not in student_ids
+    name = con.execute("SELECT name FROM student WHERE student_id = ?;", (student_ids[0],)).fetchone()[0]
+    assert name == "Newcomer"
+
+
+def test_archive_gives_a_taken_id_a_new_one(client, con, make_class):
+    first, (reused,) = make_class(students=1)
+    archive(client, first)
+    # The archived student's id is free again in the main tables and gets reused
+    second, _ = make_class(location="Porto")
+    con.execute("INSERT INTO student (student_id, name, email) VALUES (?, 'Reused', 'reused@example.pt');", (reused,))
+    after = con.execute("INSERT INTO student (name, email) VALUES ('After', 'after@example.pt');").lastrowid
+    con.executemany("INSERT INTO class_student (class_id, student_id) VALUES (?, ?);", [(second, reused), (second, after)])
+    con.commit()
+
+    archive(client, second)
+    ids = dict(con.execute("SELECT student_key, student_id FROM archive.student;").fetchall())
+    assert ids[f"student.{first}.0@example.pt"] == reused
+    assert ids["after@example.pt"] == after
+    assert ids["reused@example.pt"] not in (reused, after)
+
+
+def test_a_reused_id_lists_both_students(client, con, make_class):
+    class_id, (archived_id,) = make_class(students=1)
+    archive(client, class_id)
+    # SQLite hands the freed id to the next new student
+    other, (live_id,) = make_class(location="Porto", students=1, prefix="live")
+    assert live_id == archived_id
+
+    pages, after = [], None
+    while True:
+        body = client.get("/api/v1/students", query_string={"limit": 1, "after": after or ""}).get_json()
+        pages += [(student["tier"], student["name"]) for student in body["data"]]
+        if not (after := body["next_cursor"]):
+            break
+    assert pages == [("active", "Live 0"), ("archive", "Student 0")]
+
+    assert client.get(f"/api/v1/students/{live_id}").get_json()["data"]["name"] == "Live 0"
+    assert client.get(f"/api/v1/students/archive/{archived_id}").get_json()["data"]["name"] == "Student 0"
+
+    rows = list(csv.DictReader(io.StringIO(client.get("/export/students").get_data(as_text=True))))
+    assert [(row["tier"], int(row["student_id"]), row["student_key"]) for row in rows] == [
+        ("active", live_id, f"live.{other}.0@example.pt"),
+        ("archive", archived_id, f"student.{class_id}.0@example.pt"),
+    ]
@@ -0,0 +1,58 @@
+import pytest
+import app as app_module
+from auth import PasswordVerifier
+
+argon2 = pytest.importorskip("argon2")
+
+# Cheap parameters keep the tests fast; "old" is what an earlier deployment used
+OLD = argon2.PasswordHasher(time_cost=1, memory_cost=1024, parallelism=1)
+CURRENT = argon2.PasswordHasher(time_cost=2, memory_cost=1024, parallelism=1)
+
+
+@pytest.fixture
+def teacher(con):
+    con.execute(
+        "INSERT INTO teacher (name, email, password) VALUES ('Tiago', 'admin@dev.com', ?);",
+        (OLD.hash("123"),),
+    )
+    con.commit()
+
+    def stored_hash():
+        return con.execute("SELECT password FROM teacher WHERE email = 'admin@dev.com';").fetchone()[0]
+
+    return stored_hash
+
+
+def login(client, password):
+    return client.post("/login", data={"email": "admin@dev.com", "password": password})
+
+
+def test_an_outdated_hash_is_upgraded_on_login(client, teacher, monkeypatch):
+    monkeypatch.setattr(app_module, "verifier", PasswordVerifier(hasher=CURRENT))
+    old_hash = teacher()
+
+    assert "Incorrect password" in login(client, "wrong").text
+    assert teacher() == old_hash
+
+    assert login(client, "123").status_code == 302
+    new_hash = teacher()
+    assert new_hash != old_hash and "t=2" in new_hash
+    CURRENT.verify(new_hash, "123")
+
+    # Already current: left alone
+    assert login(client, "123").status_code == 302
+    assert teacher() == new_hash
+
+
+def test_a_full_login_queue_turns_logins_away(client, teacher, monkeypatch):
+    verifier = PasswordVerifier(hasher=OLD, max_pending=1, wait=0)
+    monkeypatch.setattr(app_module, "verifier", verifier)
+
+    # Someone else holds the only slot
+    verifier.slots.acquire()
+    try:
+        response = login(client, "123")
+        assert response.status_code == 503 and "Too many people" in response.text
+    finally:
+        verifier.slots.release()
+    assert login(client, "123").status_code == 302
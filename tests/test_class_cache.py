@@ -0,0 +1,36 @@
+import app as app_module
+from db import get_db
+
+
+def lookup(app, class_id):
+    # fetch_class inside a request, with every statement it ran
+    with app.test_request_context():
+        statements = []
+        get_db(app.config["DATABASE"]).set_trace_callback(statements.append)
+        class_data = app_module.fetch_class(class_id)
+        get_db(app.config["DATABASE"]).set_trace_callback(None)
+        return class_data, statements
+
+
+def test_a_cached_class_costs_no_query(app, make_class):
+    class_id, _ = make_class()
+
+    class_data, statements = lookup(app, class_id)
+    assert class_data["location"] == "Lisbon" and len(statements) == 1
+    assert lookup(app, class_id) == (class_data, [])
+
+
+def test_archiving_and_deleting_forget_the_class(app, client, make_class):
+    class_id, _ = make_class()
+    lookup(app, class_id)
+
+    client.post("/actions/archive", data={"class_id": str(class_id)})
+    assert lookup(app, class_id)[0]["archived"] == 1
+    client.post("/actions/unarchive", data={"class_id": str(class_id)})
+    assert lookup(app, class_id)[0]["archived"] == 0
+
+    client.post("/actions/delete", data={"class_id": str(class_id)})
+    # SQLite hands the freed id to the next class
+    reused, _ = make_class(location="Porto")
+    assert reused == class_id
+    assert lookup(app, class_id)[0]["location"] == "Porto"
@@ -0,0 +1,82 @@
+import gzip
+import pytest
+import compress
+
+
+def roster_url(make_class, students=20):
+    class_id, _ = make_class(students=students)
+    return f"/api/v1/classes/{class_id}/students"
+
+
+def test_gzip_and_weak_etag(client, make_class):
+    url = roster_url(make_class)
+    plain = client.get(url)
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert "Accept-Ranges" not in response.headers
+    assert gzip.decompress(response.data) == plain.data
+    assert int(response.headers["Content-Length"]) == len(response.data) < len(plain.data)
+    assert response.headers["ETag"] == f"W/{plain.headers['ETag']}"
+
+    # The weakened tag still revalidates, and the 304 carries it too
+    again = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == response.headers["ETag"]
+
+
+def test_brotli_is_preferred(client, make_class):
+    brotli = pytest.importorskip("brotli")
+    url = roster_url(make_class)
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["Content-Encoding"] == "br"
+    assert brotli.decompress(response.data) == client.get(url).data
+    # Unless the client says otherwise
+    response = client.get(url, headers={"Accept-Encoding": "gzip;q=1, br;q=0.5"})
+    assert response.headers["Content-Encoding"] == "gzip"
+
+
+def test_small_head_and_identity_responses_are_left_alone(client, make_class):
+    class_id, _ = make_class(students=1)
+    small = client.get(f"/api/v1/classes/{class_id}", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+    assert small.headers["Vary"] == "Accept-Encoding"
+
+    url = roster_url(make_class)
+    assert "Content-Encoding" not in client.head(url, headers={"Accept-Encoding": "gzip"}).headers
+    assert "Content-Encoding" not in client.get(url, headers={"Accept-Encoding": "identity"}).headers
+    assert "Content-Encoding" not in client.get(url, headers={"Accept-Encoding": "gzip;q=0"}).headers
+
+
+def test_streamed_export_is_compressed_chunk_by_chunk(client, make_class):
+    make_class(students=40)
+    plain = client.get("/export/students").data
+
+    response = client.get("/export/students", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in response.headers
+    assert gzip.decompress(response.data) == plain
+
+    # A .gz download is already compressed, and stays as it is
+    download = client.get("/export/students?gzip=1", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in download.headers
+    assert gzip.decompress(download.data) == plain
+
+
+def test_precompressed_static_files(tmp_path):
+    css = tmp_path / "styles" / "site.css"
+    css.parent.mkdir()
+    css.write_text("body { margin: 0; }\n" * 100)
+    (tmp_path / "tiny.js").write_text("x()")
+
+    written = compress.precompress(str(tmp_path))
+    assert str(css) + ".gz" in written
+    assert not any("tiny.js" in path for path in written)
+    assert gzip.decompress((tmp_path / "styles" / "site.css.gz").read_bytes()) == css.read_bytes()
+
+    middleware = compress.CompressionMiddleware(None, str(tmp_path), "/static")
+    assert middleware.precompressed("/static/styles/site.css", "gzip") == "/static/styles/site.css.gz"
+    assert middleware.precompressed("/static/tiny.js", "gzip") is None
+    assert middleware.precompressed("/static/../styles/site.css", "gzip") is None
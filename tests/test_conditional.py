@@ -0,0 +1,62 @@
+import time
+import conditional
+
+
+def add_student(client, class_id, email):
+    client.post(
+        "/confirm/add_student",
+        data={
+            "class_id": str(class_id),
+            "name": "New Student",
+            "email": email,
+            "phone": "912345678",
+            "location": "Lisbon",
+            "class_type": "PowerUp",
+        },
+    )
+
+
+def test_etag_revalidates_until_a_write(client, make_class):
+    class_id, _ = make_class(students=2)
+    url = f"/api/v1/classes/{class_id}/students"
+
+    first = client.get(url)
+    assert first.status_code == 200 and first.headers["Cache-Control"] == "no-cache"
+    etag = first.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    add_student(client, class_id, "new.student@example.pt")
+
+    fresh = client.get(url, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+    assert len(fresh.get_json()["data"]) == 3
+
+
+def test_html_pages_revalidate(client, make_class):
+    class_id, _ = make_class(students=2)
+    first = client.get(f"/list?class_id={class_id}")
+    assert first.status_code == 200
+
+    again = client.get(f"/list?class_id={class_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304 and not again.data
+
+
+def test_last_modified_only_once_its_second_is_over(client, make_class, monkeypatch):
+    class_id, _ = make_class()
+    url = f"/api/v1/classes/{class_id}"
+    add_student(client, class_id, "just.now@example.pt")
+
+    # Written this second: no Last-Modified yet, and no date can earn a 304
+    response = client.get(url)
+    assert "Last-Modified" not in response.headers
+    future = "Wed, 21 Oct 2099 07:28:00 GMT"
+    assert client.get(url, headers={"If-Modified-Since": future}).status_code == 200
+
+    later = time.time() + 2
+    monkeypatch.setattr(conditional.time, "time", lambda: later)
+    last_modified = client.get(url).headers["Last-Modified"]
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    # If-None-Match wins, even with a date that would match
+    stale = {"If-None-Match": '"stale"', "If-Modified-Since": last_modified}
+    assert client.get(url, headers=stale).status_code == 200
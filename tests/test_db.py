@@ -0,0 +1,18 @@
+import app as app_module
+
+
+def test_one_pooled_connection_per_request(app):
+    with app.test_request_context():
+        con, _ = app_module.connect_to_db()
+        assert app_module.connect_to_db()[0] is con
+        assert con.execute("PRAGMA foreign_keys;").fetchone()[0] == 1
+        assert con.execute("PRAGMA journal_mode;").fetchone()[0] == "wal"
+        # Left mid-transaction by a failed route
+        con.execute("INSERT INTO class (course, archived) VALUES ('Unfinished', 0);")
+
+    # Back in the pool, rolled back, and handed to the next request
+    with app.test_request_context():
+        again, _ = app_module.connect_to_db()
+        assert again is con and not again.in_transaction
+        assert again.execute("SELECT COUNT(*) FROM class;").fetchone()[0] == 0
+
@@ -0,0 +1,31 @@
+def delete(client, class_id):
+    assert client.post("/actions/delete", data={"class_id": str(class_id)}).status_code == 200
+
+
+def test_delete_keeps_students_still_in_an_advanced_class(client, con, make_class, counts):
+    class_id, student_ids = make_class(students=3)
+    client.post("/confirm_advance", data={"class_id": str(class_id), "checked": [str(student_ids[0])]})
+    target = con.execute("SELECT class_id FROM class WHERE class_type = 'Advanced';").fetchone()[0]
+    # The source class is archived by the promotion; bring it back to delete it from the hot tables
+    client.post("/actions/unarchive", data={"class_id": str(class_id)})
+
+    delete(client, class_id)
+
+    assert con.execute("SELECT COUNT(*) FROM class WHERE class_id = ?;", (class_id,)).fetchone()[0] == 0
+    assert [row[0] for row in con.execute("SELECT student_id FROM student;")] == [student_ids[0]]
+    assert counts(target) == (1, 1)
+    assert con.execute("SELECT COUNT(*) FROM promotion;").fetchone()[0] == 0
+    assert con.execute("SELECT SUM(classes) FROM class_count;").fetchone()[0] == 1
+
+
+def test_delete_an_archived_class_clears_the_archive_tier(client, con, make_class):
+    class_id, _ = make_class(students=2)
+    kept, _ = make_class(location="Porto", students=1, prefix="kept")
+    client.post("/actions/archive", data={"class_id": str(class_id)})
+    client.post("/actions/archive", data={"class_id": str(kept)})
+
+    delete(client, class_id)
+
+    assert [row[0] for row in con.execute("SELECT class_id FROM archive.class;")] == [kept]
+    assert [row[0] for row in con.execute("SELECT student_key FROM archive.student;")] == [f"kept.{kept}.0@example.pt"]
+    assert con.execute("SELECT COUNT(*) FROM archive.class_student;").fetchone()[0] == 1
@@ -0,0 +1,51 @@
+import csv, gzip, io, json
+import export
+
+
+def csv_rows(data):
+    return list(csv.DictReader(io.StringIO(data.decode())))
+
+
+def ndjson_rows(data):
+    return [json.loads(line) for line in data.decode().splitlines()]
+
+
+def test_ndjson_has_the_csv_rows(client, make_class, monkeypatch):
+    class_id, _ = make_class(students=5)
+    # Several fetch steps, so rows are streamed chunk by chunk
+    monkeypatch.setattr(export, "FETCH_ROWS", 2)
+    url = f"/export/classes/{class_id}/students"
+
+    as_csv = client.get(url)
+    as_ndjson = client.get(url, query_string={"format": "ndjson"})
+
+    assert as_csv.headers["Content-Type"] == "text/csv; charset=utf-8"
+    assert as_ndjson.headers["Content-Type"] == "application/x-ndjson"
+    assert as_ndjson.headers["Content-Disposition"] == f'attachment; filename="class-{class_id}-students.ndjson"'
+    rows = ndjson_rows(as_ndjson.data)
+    assert [row["name"] for row in rows] == [f"Student {i}" for i in range(5)]
+    assert [{key: str(value) for key, value in row.items()} for row in rows] == csv_rows(as_csv.data)
+
+
+def test_gzip_download(client, make_class):
+    class_id, _ = make_class(students=3)
+    url = f"/export/classes/{class_id}/students"
+    plain = client.get(url, query_string={"format": "ndjson"}).data
+
+    download = client.get(url, query_string={"format": "ndjson", "gzip": "1"})
+    assert download.headers["Content-Type"] == "application/gzip"
+    assert download.headers["Content-Disposition"].endswith('.ndjson.gz"')
+    assert gzip.decompress(download.data) == plain
+
+
+def test_archived_rosters_and_bad_formats(client, make_class):
+    class_id, _ = make_class(students=2)
+    assert client.post("/actions/archive", data={"class_id": str(class_id)}).status_code == 200
+
+    # The roster is read from wherever it lives now
+    rows = csv_rows(client.get(f"/export/classes/{class_id}/students").data)
+    assert [row["name"] for row in rows] == ["Student 0", "Student 1"]
+    rows = ndjson_rows(client.get("/export/archived_classes", query_string={"format": "ndjson"}).data)
+    assert [(row["class_id"], row["name"]) for row in rows] == [(class_id, "Student 0"), (class_id, "Student 1")]
+
+    assert client.get("/export/students", query_string={"format": "xml"}).status_code == 400
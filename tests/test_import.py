@@ -0,0 +1,70 @@
+import io
+
+
+CSV = """Name,email,phone
+Ana Silva,ana.silva@example.pt,912345678
+Rui Costa,Rui.Costa@Example.pt ,+351 923 456 789
+Marta Reis,marta.reis@example.pt,934567890
+"""
+
+
+def upload(client, class_id, text, **form):
+    return client.post(
+        "/actions/import_data",
+        data={"class_id": str(class_id), "import": (io.BytesIO(text.encode()), "roster.csv"), **form},
+        content_type="multipart/form-data",
+    )
+
+
+def roster(con, class_id):
+    return sorted(
+        tuple(row)
+        for row in con.execute(
+            """SELECT s.name, s.email, s.phone FROM class_student AS cs
+            JOIN student AS s ON s.student_id = cs.student_id WHERE cs.class_id = ?;""",
+            (class_id,),
+        )
+    )
+
+
+def test_import_then_reimport_is_idempotent(client, con, make_class, counts):
+    class_id, _ = make_class()
+
+    assert upload(client, class_id, CSV).status_code == 302
+    first = roster(con, class_id)
+    assert len(first) == 3
+    assert ("Rui Costa", "rui.costa@example.pt", "923 456 789") in first
+
+    assert upload(client, class_id, CSV).status_code == 302
+    assert roster(con, class_id) == first
+    assert con.execute("SELECT COUNT(*) FROM student;").fetchone()[0] == 3
+    assert counts(class_id) == (3, 3)
+
+
+def test_import_matches_students_added_with_different_case(client, con, make_class):
+    class_id, _ = make_class()
+    client.post(
+        "/confirm/add_student",
+        data={
+            "class_id": str(class_id),
+            "name": "Ana Silva",
+            "email": "  Ana.Silva@Example.PT",
+            "phone": "912345678",
+            "location": "Lisbon",
+            "class_type": "PowerUp",
+        },
+    )
+
+    assert upload(client, class_id, CSV).status_code == 302
+    emails = [row[0] for row in con.execute("SELECT email FROM student ORDER BY email;")]
+    assert emails == ["ana.silva@example.pt", "marta.reis@example.pt", "rui.costa@example.pt"]
+
+
+def test_rejected_rows_are_reported_and_skipped(client, con, make_class):
+    class_id, _ = make_class()
+    text = CSV + "No Email,not-an-email,912345678\nBad Phone,bad.phone@example.pt,12\n"
+
+    response = upload(client, class_id, text)
+    assert response.status_code == 200
+    assert "Invalid email" in response.text and "Invalid phone number" in response.text
+    assert len(roster(con, class_id)) == 3
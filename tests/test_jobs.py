@@ -0,0 +1,47 @@
+import io, time
+import app as app_module
+from jobs import JobRunner
+
+CSV = "Name,email,phone\nAna Silva,ana.silva@example.pt,912345678\nRui Costa,rui.costa@example.pt,923456789\n"
+
+
+def queue_import(client, class_id, text=CSV):
+    return client.post(
+        "/actions/import_data",
+        data={"class_id": str(class_id), "background": "1", "import": (io.BytesIO(text.encode()), "roster.csv")},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+
+
+def test_background_import_runs_against_the_apps_database(client, con, make_class, counts):
+    class_id, _ = make_class(students=1)
+
+    response = queue_import(client, class_id)
+    assert response.status_code == 202
+    status_url = response.get_json()["status_url"]
+
+    deadline = time.monotonic() + 10
+    while (job := client.get(status_url).get_json())["status"] not in ("done", "failed"):
+        assert time.monotonic() < deadline, job
+        time.sleep(0.02)
+
+    assert job["status"] == "done", job["error"]
+    assert (job["processed"], job["imported"], job["rejected"]) == (2, 2, 0)
+    assert counts(class_id) == (3, 3)
+    assert client.get("/jobs/999").status_code == 404
+
+
+def test_a_full_queue_turns_the_upload_away(client, make_class, monkeypatch, tmp_path):
+    class_id, _ = make_class()
+    # No workers, room for one job
+    monkeypatch.setattr(app_module, "jobs", JobRunner(workers=0, queue_size=1))
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setattr(app_module.tempfile, "tempdir", str(spool))
+
+    assert queue_import(client, class_id).status_code == 202
+    response = queue_import(client, class_id)
+    assert response.status_code == 503 and response.headers["Retry-After"] == "60"
+    # Only the queued job's upload is left on disk
+    assert len(list(spool.iterdir())) == 1
@@ -0,0 +1,52 @@
+import sqlite3
+import migrations
+
+
+def class_totals(con):
+    kept = con.execute("SELECT archived, location, classes FROM class_count WHERE classes > 0 ORDER BY 1, 2;")
+    return [tuple(row) for row in kept]
+
+
+def test_a_class_without_a_location_can_be_added(client, con):
+    response = client.post(
+        "/confirm/add_class",
+        data={"course": "Junior Fullstack Developer", "class_type": "PowerUp", "time_slot": "Morning", "year": "2024"},
+    )
+    assert response.status_code == 302
+    assert class_totals(con) == [(0, "", 1)]
+
+    class_id = con.execute("SELECT class_id FROM class;").fetchone()[0]
+    assert client.post("/actions/archive", data={"class_id": str(class_id)}).status_code == 200
+    assert class_totals(con) == [(1, "", 1)]
+
+
+def test_counters_migrate_past_null_rows(tmp_path, monkeypatch):
+    # A database from before the counters, with rows the old forms could save
+    con = sqlite3.connect(str(tmp_path / "old.db"))
+    with monkeypatch.context() as patch:
+        patch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:7])
+        migrations.migrate(con)
+    con.executemany(
+        "INSERT INTO class (course, class_type, location, year, archived) VALUES ('Course', 'PowerUp', ?, 2024, ?);",
+        [("Lisbon", 0), (None, 0), ("Porto", None)],
+    )
+    con.commit()
+
+    assert migrations.migrate(con) == [8, 9, 10, 11]
+    assert class_totals(con) == [(0, "", 1), (0, "Lisbon", 1), ("", "Porto", 1)]
+    con.execute("DELETE FROM class WHERE location IS NULL OR archived IS NULL;")
+    assert class_totals(con) == [(0, "Lisbon", 1)]
+
+
+def test_migrations_run_once_and_leave_no_full_scans(tmp_path):
+    path = str(tmp_path / "new.db")
+    assert migrations.migrate_db(path) == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate_db(path) == []
+
+    con = sqlite3.connect(path)
+    try:
+        assert migrations.full_scans(con) == {}
+        # And the check would catch one
+        assert migrations.full_scans(con, {"scan": ("SELECT * FROM student WHERE name = ?;", ("Ana",))})
+    finally:
+        con.close()
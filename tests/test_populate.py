@@ -0,0 +1,34 @@
+import os
+import archive, populate
+
+
+def totals(db_path):
+    con = archive.connect_writer(db_path)
+    try:
+        return [
+            con.execute(query).fetchone()[0]
+            for query in (
+                "SELECT COUNT(*) FROM main.class;",
+                "SELECT COUNT(*) FROM archive.class;",
+                "SELECT COUNT(*) FROM archive.class_student;",
+            )
+        ]
+    finally:
+        con.close()
+
+
+def test_snapshot_and_replace_take_the_archive_tier_along(tmp_path):
+    db_path, snapshot = str(tmp_path / "d.db"), str(tmp_path / "snap.db")
+    populate.generate(db_path, students=40, classes=4, archived_ratio=0.5, seed=3)
+    assert archive.sweep(db_path)
+    saved = totals(db_path)
+    populate.write_snapshot(db_path, snapshot)
+    assert os.path.exists(str(tmp_path / "snap-archive.db"))
+
+    # A new database doesn't inherit the old one's archived rosters
+    populate.remove_db(db_path)
+    populate.generate(db_path, students=10, classes=2, archived_ratio=0)
+    assert totals(db_path) == [2, 0, 0]
+
+    populate.restore_snapshot(snapshot, db_path)
+    assert totals(db_path) == saved
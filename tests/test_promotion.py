@@ -0,0 +1,66 @@
+def snapshot(con):
+    # Every row promotion may touch
+    return [
+        [tuple(row) for row in con.execute(query)]
+        for query in (
+            "SELECT * FROM class ORDER BY class_id;",
+            "SELECT * FROM class_student ORDER BY class_id, student_id;",
+            "SELECT * FROM promotion ORDER BY class_id, student_id;",
+        )
+    ]
+
+
+def advance(client, class_id, student_ids, dry_run=False):
+    data = {"class_id": str(class_id), "checked": [str(student_id) for student_id in student_ids]}
+    if dry_run:
+        data["dry_run"] = "1"
+    return client.post("/confirm_advance", data=data)
+
+
+def test_dry_run_previews_without_writing(client, con, make_class):
+    class_id, student_ids = make_class(students=3)
+    before = snapshot(con)
+
+    response = advance(client, class_id, student_ids[:2], dry_run=True)
+
+    assert response.status_code == 200
+    assert "2 student(s) will be advanced" in response.text
+    assert "Student 0" in response.text and "Student 2" not in response.text
+    assert snapshot(con) == before
+
+
+def test_promotion_moves_students_and_archives_the_source(client, con, make_class, counts):
+    class_id, student_ids = make_class(students=3)
+
+    response = advance(client, class_id, student_ids[:2])
+
+    assert response.status_code == 302
+    target = con.execute(
+        "SELECT class_id FROM class WHERE class_type = 'Advanced' AND location = 'Lisbon' AND year = 2024;"
+    ).fetchone()[0]
+    enrolled = [row[0] for row in con.execute("SELECT student_id FROM class_student WHERE class_id = ?;", (target,))]
+    assert sorted(enrolled) == student_ids[:2]
+    source = con.execute("SELECT archived, in_archive, promoted_count FROM class WHERE class_id = ?;", (class_id,)).fetchone()
+    assert tuple(source) == (1, 1, 2)
+    assert counts(class_id) == (3, 3)
+    assert counts(target) == (2, 2)
+
+
+def test_promotion_reuses_the_cohorts_advanced_class(client, con, make_class, counts):
+    target, _ = make_class("Advanced", students=1, prefix="advanced")
+    class_id, student_ids = make_class(students=2)
+
+    assert advance(client, class_id, student_ids).status_code == 302
+    assert counts(target) == (3, 3)
+    assert con.execute("SELECT COUNT(*) FROM class WHERE class_type = 'Advanced';").fetchone()[0] == 1
+
+
+def test_advanced_classes_are_skipped(client, con, make_class):
+    target, advanced_ids = make_class("Advanced", students=2, prefix="advanced")
+    before = snapshot(con)
+
+    preview = advance(client, target, advanced_ids, dry_run=True)
+    assert f"Skipped #{target}" in preview.text and "Confirm Advancement" not in preview.text
+
+    assert advance(client, target, advanced_ids).status_code == 200
+    assert snapshot(con) == before
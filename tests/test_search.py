@@ -0,0 +1,99 @@
+import search
+from versions import bump_version
+
+
+def find(client, q, scope=None, **args):
+    response = client.get("/search", query_string={"q": q, **({"scope": scope} if scope else {}), **args})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def class_ids(body):
+    return [result["class_id"] for result in body["results"]]
+
+
+def rename(con, student_id, name):
+    con.execute("UPDATE student SET name = ? WHERE student_id = ?;", (name, student_id))
+    con.commit()
+
+
+def test_scope_picks_active_archived_or_both(client, con, make_class):
+    active, (ana,) = make_class(students=1)
+    archived, (other,) = make_class(location="Porto", students=1, prefix="other")
+    rename(con, ana, "João Silva")
+    rename(con, other, "Joana Silva")
+    # The archived roster moves to the archive tier, and is still searched there
+    assert client.post("/actions/archive", data={"class_id": str(archived)}).status_code == 200
+
+    assert class_ids(find(client, "silva", "active")) == [active]
+    assert class_ids(find(client, "silva")) == [archived]
+    assert sorted(class_ids(find(client, "silva", "all"))) == [active, archived]
+    # Accents fold like the FTS tokenizer, and every word is a prefix
+    assert class_ids(find(client, "joao", "all")) == [active]
+    assert class_ids(find(client, "jo silv", "all")) == class_ids(find(client, "silva", "all"))
+
+
+def test_class_fields_ids_and_fts_syntax(client, make_class):
+    lisbon, _ = make_class()
+    porto, _ = make_class(location="Porto")
+
+    assert class_ids(find(client, "porto", "active")) == [porto]
+    assert class_ids(find(client, str(lisbon), "active"))[0] == lisbon
+    # Quotes, operators and a bare * are words, not FTS syntax
+    for q in ('"porto', "porto OR lisbon", "*", "NEAR(porto)"):
+        find(client, q, "active")
+
+
+def test_results_page_with_a_cursor(client, make_class):
+    made = [make_class(students=1)[0] for _ in range(5)]
+
+    first = find(client, "student", "active", limit=2)
+    second = find(client, "student", "active", limit=2, after=first["next_cursor"])
+    rest = find(client, "student", "active", limit=2, after=second["next_cursor"])
+    assert sorted(class_ids(first) + class_ids(second) + class_ids(rest)) == made
+    assert rest["next_cursor"] is None
+
+    # A cursor that isn't one of ours starts from the top
+    for cursor in ("bm90IGEgY3Vyc29y", search.encode_cursor({"rank": None, "class_id": "x"}, search.RANK_ORDER)):
+        assert class_ids(find(client, "student", "active", limit=2, after=cursor)) == class_ids(first)
+
+
+def test_a_write_invalidates_cached_results(client, con, make_class):
+    class_id, _ = make_class()
+    other, _ = make_class(location="Porto")
+    assert class_ids(find(client, "silva", "active")) == []
+
+    client.post(
+        "/confirm/add_student",
+        data={
+            "class_id": str(other),
+            "name": "Maria Silva",
+            "email": "maria.silva@example.pt",
+            "phone": "912345678",
+            "location": "Porto",
+            "class_type": "PowerUp",
+        },
+    )
+    assert class_ids(find(client, "silva", "active")) == [other]
+
+
+def test_longer_queries_reuse_a_cached_prefix(con, make_class, monkeypatch):
+    class_id, (student_id,) = make_class(students=1)
+    rename(con, student_id, "Maria Silva")
+    cache = search.SearchCache()
+    cur = con.cursor()
+    assert [result["class_id"] for result in cache.lookup(cur, ["sil"], "active")["results"]] == [class_id]
+
+    # "silva" is filtered from "sil" without asking SQLite
+    monkeypatch.setattr(search, "find_matches", None)
+    assert [result["class_id"] for result in cache.lookup(cur, ["silva"], "active")["results"]] == [class_id]
+    assert cache.lookup(cur, ["silvano"], "active")["results"] == []
+
+    # After a write nothing older is reused
+    monkeypatch.undo()
+    before = cache.version
+    bump_version(cur, "test")
+    con.commit()
+    cache.lookup(cur, ["silva"], "active")
+    assert cache.version > before
+    assert list(cache.entries.entries) == [(cache.version, "active", "silva")]
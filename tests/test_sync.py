@@ -0,0 +1,103 @@
+import io
+from importer import sync_students
+
+
+def sync(con, class_id, text):
+    return sync_students(con, class_id, io.BytesIO(text.encode()))
+
+
+def roster(con, class_id):
+    return {
+        row["email"]: (row["student_id"], row["name"], row["phone"])
+        for row in con.execute(
+            """SELECT s.student_id, s.name, s.email, s.phone FROM class_student AS cs
+            JOIN student AS s ON s.student_id = cs.student_id WHERE cs.class_id = ?;""",
+            (class_id,),
+        )
+    }
+
+
+def versions(con):
+    return con.execute("SELECT name, version FROM data_version ORDER BY name;").fetchall()
+
+
+def test_sync_applies_only_the_delta(con, make_class, counts):
+    class_id, _ = make_class(students=4)
+    before = roster(con, class_id)
+    kept, renamed, new_email, dropped = sorted(before)
+
+    text = "Name,email,phone\n" + "\n".join(
+        [
+            f"Student 0,{kept},{before[kept][2]}",
+            f"New Name,{renamed},{before[renamed][2]}",
+            # Same phone, new email: the same student, not a new one
+            f"Student 2,changed@example.pt,{before[new_email][2]}",
+            "Brand New,brand.new@example.pt,966666666",
+        ]
+    )
+    report = sync(con, class_id, text)
+
+    assert (report["added"], report["updated"], report["removed"], report["unchanged"]) == (1, 2, 1, 1)
+    after = roster(con, class_id)
+    assert set(after) == {kept, renamed, "changed@example.pt", "brand.new@example.pt"}
+    assert after[renamed][:2] == (before[renamed][0], "New Name")
+    assert after["changed@example.pt"][0] == before[new_email][0]
+    assert con.execute("SELECT 1 FROM student WHERE email = ?;", (dropped,)).fetchone() is None
+    assert counts(class_id) == (4, 4)
+
+
+def test_unchanged_file_writes_nothing(con, make_class):
+    class_id, _ = make_class(students=3)
+    text = "Name,email,phone\n" + "\n".join(
+        f"{name},{email},{phone}" for email, (_, name, phone) in roster(con, class_id).items()
+    )
+    before = versions(con)
+
+    report = sync(con, class_id, text)
+
+    assert (report["added"], report["updated"], report["removed"], report["unchanged"]) == (0, 0, 0, 3)
+    assert versions(con) == before
+
+
+def test_empty_or_rejected_rows_remove_nobody(con, make_class):
+    class_id, _ = make_class(students=3)
+    before = roster(con, class_id)
+    kept = sorted(before)[0]
+
+    assert sync(con, class_id, "Name,email,phone\n")["removed"] == 0
+    # A file whose every row was rejected looks like a bad export, not an empty class
+    report = sync(con, class_id, f"Name,email,phone\nStudent 0,{kept},not a phone\n")
+    assert report["rejected"] == 1 and report["removed"] == 0
+    assert roster(con, class_id) == before
+
+
+def test_a_rejected_row_keeps_its_student(con, make_class):
+    class_id, _ = make_class(students=3)
+    before = roster(con, class_id)
+    valid, typo, dropped = sorted(before)
+
+    # A typo in a row keeps that student enrolled; only students in neither row are removed
+    text = f"Name,email,phone\nStudent,{valid},{before[valid][2]}\nStudent,{typo},not a phone\n"
+    report = sync(con, class_id, text)
+
+    assert (report["rejected"], report["removed"]) == (1, 1)
+    assert set(roster(con, class_id)) == {valid, typo}
+    assert roster(con, class_id)[typo] == before[typo]
+    assert con.execute("SELECT 1 FROM student WHERE email = ?;", (dropped,)).fetchone() is None
+
+
+def test_sync_through_the_import_form(client, con, make_class):
+    class_id, _ = make_class(students=2)
+    # The weekly re-import goes into a class that already has students
+    page = client.get(f"/list?class_id={class_id}").text
+    assert 'action="/actions/import_data"' in page and 'name="sync"' in page
+    text = "Name,email,phone\nOnly One,only.one@example.pt,912345678\n"
+
+    response = client.post(
+        "/actions/import_data",
+        data={"class_id": str(class_id), "sync": "1", "import": (io.BytesIO(text.encode()), "roster.csv")},
+        content_type="multipart/form-data",
+    )
+
+    assert response.status_code == 200
+    assert list(roster(con, class_id)) == ["only.one@example.pt"]
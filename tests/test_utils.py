@@ -0,0 +1,31 @@
+import pytest
+from utils import validate_phone_num, validate_phone_nums
+
+NUMBERS = [
+    "912345678",
+    "912 345 678",
+    "+351 923 456 789",
+    "00351 934 567 890",
+    "(+351) 965-432-109",
+    "961234567",  # 96x is a fast path too
+    "211234567",  # a landline goes through libphonenumber
+    "+44 20 7946 0958",
+    "+1 202-555-0143",
+    "999999999",
+    "12",
+    "123456789012345678901",
+    "91234567a",
+    "not a phone",
+    "",
+]
+
+
+@pytest.mark.parametrize("region", ["PT", "GB"])
+def test_batch_validation_agrees_with_single_validation(region):
+    assert validate_phone_nums(NUMBERS, region) == [validate_phone_num(number, region) for number in NUMBERS]
+
+
+def test_batch_validation_keeps_order_and_duplicates():
+    numbers = ["912345678", "12", "912345678"]
+    assert validate_phone_nums(numbers, "PT") == ["912 345 678", None, "912 345 678"]
+